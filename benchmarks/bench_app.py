@@ -0,0 +1,205 @@
+"""
+End-to-end app benchmark: builds a synthetic database (see synthetic.py, or reuses one with --database) and
+drives the real routes through the Flask test client, first one scenario at a time from a single client, then
+as a concurrent load of --clients logged-in clients running a weighted mix for --duration seconds.
+
+Scenarios: the home page, the upcoming matches page and a match page (anonymous, i.e. cached, and logged in),
+a bet POST, a login POST (a full password check) and /combine (enqueues a reprice). Each reports
+requests/s and p50/p95/p99 latency in ms. The JSON report carries the commit it ran on; --output saves it
+and --compare prints the change against a previously saved one.
+
+    python benchmarks/bench_app.py --users 10000 --matches 2000 --bets 100000 --output before.json
+    python benchmarks/bench_app.py --users 10000 --matches 2000 --bets 100000 --compare before.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic  # noqa: E402
+
+# weights of the concurrent mix: mostly reads, some bets, the odd login and reprice request
+mix = {'home': 10, 'matches': 30, 'view-match': 30, 'bet': 15, 'login': 3, 'combine': 2}
+expected_status = {'bet': 302, 'login': 302, 'combine': 302}
+
+
+class Client:
+    """a test client logged in as one synthetic user, betting on the upcoming matches in turn"""
+
+    def __init__(self, app, user_id, upcoming, rng):
+        self.http = app.test_client()
+        self.user_id = user_id
+        self.upcoming = upcoming
+        self.rng = rng
+        self.next_bet = 0
+
+    def login(self):
+        return self.http.post('/login', data={'number': 9000000 + self.user_id, 'password': synthetic.password})
+
+    def bet_form(self):
+        match_id, team = self.upcoming[self.next_bet % len(self.upcoming)]
+        self.next_bet += 1
+        return f'/view-match/{match_id}', {'user_team': team, 'token_amt': 1}
+
+    def request(self, scenario):
+        if scenario == 'home':
+            return self.http.get('/')
+        if scenario == 'matches':
+            return self.http.get('/matches')
+        if scenario == 'view-match':
+            return self.http.get(f'/view-match/{self.rng.choice(self.upcoming)[0]}')
+        if scenario == 'bet':
+            path, form = self.bet_form()
+            return self.http.post(path, data=form)
+        if scenario == 'login':
+            return self.login()
+        if scenario == 'combine':
+            return self.http.get('/combine')
+        raise ValueError(scenario)
+
+
+def summarize(latencies, elapsed, errors=0):
+    """input: request latencies (s) and the wall time they took, output: throughput and percentiles in ms"""
+    if len(latencies) < 2:
+        return {'requests': len(latencies), 'errors': errors}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'requests': len(latencies), 'errors': errors, 'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(cuts[49] * 1000, 3), 'p95_ms': round(cuts[94] * 1000, 3),
+            'p99_ms': round(cuts[98] * 1000, 3)}
+
+
+def sequential(app, upcoming, args):
+    """each scenario on its own, args.requests times from one client"""
+    results = {}
+    anonymous = Client(app, 0, upcoming, random.Random(args.seed))
+    client = Client(app, 1, upcoming, random.Random(args.seed))
+    assert client.login().status_code == 302
+    for name, who, scenario in (('home (anonymous)', anonymous, 'home'), ('matches (anonymous)', anonymous, 'matches'),
+                                ('view-match (anonymous)', anonymous, 'view-match'), ('home', client, 'home'),
+                                ('matches', client, 'matches'), ('view-match', client, 'view-match'),
+                                ('bet', client, 'bet'), ('login', client, 'login'), ('combine', client, 'combine')):
+        requests = min(args.requests, len(upcoming)) if scenario == 'bet' else args.requests
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            began = time.perf_counter()
+            response = who.request(scenario)
+            latencies.append(time.perf_counter() - began)
+            errors += response.status_code != expected_status.get(scenario, 200)
+        results[name] = summarize(latencies, time.perf_counter() - start, errors)
+    return results
+
+
+def concurrent(app, upcoming, args):
+    """args.clients logged-in clients, each in its own thread, drawing scenarios from the mix for args.duration"""
+    scenarios, weights = zip(*mix.items())
+    samples = [[] for _ in range(args.clients)]
+    clients = [Client(app, user_id, upcoming, random.Random(args.seed + user_id))
+               for user_id in range(2, args.clients + 2)]
+    for client in clients:
+        assert client.login().status_code == 302
+    barrier = threading.Barrier(args.clients + 1)
+
+    def run(index):
+        client = clients[index]
+        barrier.wait()
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            scenario = client.rng.choices(scenarios, weights)[0]
+            began = time.perf_counter()
+            response = client.request(scenario)
+            samples[index].append((scenario, time.perf_counter() - began,
+                                   response.status_code != expected_status.get(scenario, 200)))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    flat = [sample for client_samples in samples for sample in client_samples]
+    report = {'clients': args.clients, 'duration_s': round(elapsed, 2),
+              'total': summarize([latency for _, latency, _ in flat], elapsed, sum(error for _, _, error in flat))}
+    for scenario in scenarios:
+        picked = [(latency, error) for name, latency, error in flat if name == scenario]
+        report[scenario] = summarize([latency for latency, _ in picked], elapsed, sum(error for _, error in picked))
+    return report
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """p50/p99 and throughput of this run relative to a saved report (1.0 = unchanged, < 1 = faster/lower)"""
+    changes = {}
+    for section in ('sequential', 'concurrent'):
+        for name, now in report[section].items():
+            before = baseline.get(section, {}).get(name)
+            if not isinstance(now, dict) or not isinstance(before, dict) or 'p50_ms' not in now or \
+                    'p50_ms' not in before:
+                continue
+            changes[f'{section}/{name}'] = {key: round(now[key] / before[key], 3)
+                                            for key in ('rps', 'p50_ms', 'p99_ms') if before[key]}
+    return {'baseline_commit': baseline.get('commit'), 'ratios': changes}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    synthetic.add_arguments(parser)
+    parser.add_argument('--database', help='an existing synthetic.py database to use instead of generating one')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario in the sequential run')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--compare', help='a report saved with --output to compare against')
+    args = parser.parse_args()
+    if args.clients + 1 > args.fresh_users:
+        parser.error('--fresh-users must cover the logged-in clients (--clients + 1)')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.database or f'{directory}/bench-app.db'
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+        os.environ['RUN_JOBS'] = '0'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        from sqlalchemy import text
+        app_module.app.config['WTF_CSRF_ENABLED'] = False
+
+        report = {'commit': commit(), 'database': synthetic.generate(app_module, args) if not args.database else path}
+        with app_module.engine.connect() as connection:
+            upcoming = connection.execute(text(
+                'SELECT matches.id, teams.name FROM matches JOIN teams ON teams.id = matches.team1_id '
+                'WHERE matches.kickoff > :now AND matches.result IS NULL ORDER BY matches.kickoff'),
+                {'now': app_module.datetime.now()}).all()
+        report['sequential'] = sequential(app_module.app, upcoming, args)
+        report['concurrent'] = concurrent(app_module.app, upcoming, args)
+        if args.compare:
+            with open(args.compare) as baseline:
+                report['compare'] = compare(report, json.load(baseline))
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(report, output, indent=2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Load test for bet placement: concurrent clients hammer BetsManager on a throwaway synthetic database (see
+synthetic.py: --users users with --balance tokens each, --matches upcoming matches), then the ledger is
+checked - no balance below zero, and every token debited is accounted for by an accepted bet.
+
+    python benchmarks/bench_bets.py --clients 32 --users 200 --matches 50 --synchronous FULL
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic  # noqa: E402
+
+
+def run(bets_manager, clients, bets_per_client, users, sides):
+    accepted, rejected = [0] * clients, [0] * clients
+
+    def client(index):
+        rng = random.Random(index)
+        for _ in range(bets_per_client):
+            try:
+                match_id, team = rng.choice(sides)
+                bets_manager.place_bet(rng.randint(1, users), match_id, team, rng.randint(1, 5))
+                accepted[index] += 1
+            except Exception:
+                rejected[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(accepted), sum(rejected), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    synthetic.add_arguments(parser)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--bets-per-client', type=int, default=200)
+    parser.add_argument('--synchronous', default='FULL', help='sqlite synchronous pragma (FULL fsyncs every commit)')
+    parser.set_defaults(users=200, matches=50, bets=0, past=0, fresh_users=0, balance=20)
+    args = parser.parse_args()
+    os.environ['SQLITE_SYNCHRONOUS'] = args.synchronous
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # generated once, then each run starts from its own copy
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-bets-seed.db'
+        os.environ['RUN_JOBS'] = '0'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from database import engine, make_engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        from bets_manager import BetsManager
+        from sqlalchemy import text
+
+        synthetic.generate(app_module, args)
+        with app_module.engine.connect() as connection:
+            sides = connection.execute(text('SELECT matches.id, teams.name FROM matches JOIN teams ON teams.id IN '
+                                            '(matches.team1_id, matches.team2_id) WHERE matches.result IS NULL')).all()
+            balance = connection.execute(text('SELECT SUM(token_balance) FROM users')).scalar()
+            seeded = connection.execute(text('SELECT COALESCE(SUM(amount), 0) FROM bets')).scalar()
+
+        for label, batch_size in (('unbatched', 1), ('group_commit', 64)):
+            path = f'{directory}/bench-bets-{label}.db'
+            with app_module.engine.connect() as connection:
+                connection.execute(text('VACUUM INTO :path'), {'path': path})
+            bind = make_engine(f'sqlite:///{path}')
+
+            accepted, rejected, elapsed = run(BetsManager(bind, batch_size=batch_size), args.clients,
+                                              args.bets_per_client, args.users, sides)
+            with bind.connect() as connection:
+                lowest = connection.execute(text('SELECT MIN(token_balance) FROM users')).scalar()
+                debited = connection.execute(text('SELECT :total - SUM(token_balance) FROM users'),
+                                             {'total': balance}).scalar()
+                wagered = connection.execute(text('SELECT COALESCE(SUM(amount), 0) FROM bets')).scalar() - seeded
+                duplicates = connection.execute(text('SELECT COUNT(*) FROM (SELECT 1 FROM bets GROUP BY user_id, '
+                                                     'match_id HAVING COUNT(*) > 1)')).scalar()
+            results[label] = {'accepted': accepted, 'rejected': rejected, 'seconds': round(elapsed, 3),
+                              'bets_per_second': round((accepted + rejected) / elapsed, 1),
+                              'min_balance': lowest, 'debited': debited, 'wagered': wagered,
+                              'duplicate_bets': duplicates}
+            assert lowest >= 0, 'a balance went negative'
+            assert abs(debited - wagered) < 1e-6, 'debits and accepted bets disagree'
+            assert duplicates == 0, 'a user has two bets on one match'
+            bind.dispose()
+        app_module.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Change-detection benchmark: a synthetic --matches match schedule goes through the teams and crawl jobs
+(browser replaced by the parsed list) three times: a first crawl, an unchanged recrawl and a recrawl with
+--changed matches edited. Reports time, write statements and schedule cache bumps for each; the unchanged
+recrawl should write nothing and bump nothing.
+
+    python benchmarks/bench_changes.py --matches 1000 --changed 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fixtures import schedule_page  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=1000, help='up to 1344, where fixture dates repeat')
+    parser.add_argument('--changed', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-changes.db'
+        os.environ['RUN_JOBS'] = '0'
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        from sqlalchemy import event, text
+
+        writes = []
+
+        @event.listens_for(app_module.engine, 'before_cursor_execute')
+        def count_writes(connection, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                writes.append(statement)
+
+        def schedule_version():
+            with app_module.engine.connect() as connection:
+                return connection.execute(text('SELECT version FROM schedule_versions WHERE id = 1')).scalar() or 0
+
+        manager = app_module.matches_manager
+        schedule = manager.parse_schedule(schedule_page(args.matches), 'lck')
+        manager.crawl = lambda leagues=None: list(schedule)
+
+        def run(name, job):
+            writes.clear()
+            version = schedule_version()
+            start = time.perf_counter()
+            detail = job()
+            elapsed = time.perf_counter() - start
+            app_module.session.remove()
+            return {'run': name, 'ms': round(elapsed * 1000, 2), 'writes': len(writes),
+                    'cache_bumps': schedule_version() - version,
+                    **{key: value for key, value in detail.items()
+                       if key in ('changed', 'upserted', 'added', 'updated')}}
+
+        report = {'matches': len(schedule), 'runs': []}
+        report['runs'].append(run('teams first', app_module.teams_job))
+        report['runs'].append(run('teams again', app_module.teams_job))
+        report['runs'].append(run('crawl first', app_module.crawl_job))
+        report['runs'].append(run('crawl unchanged', app_module.crawl_job))
+        schedule[-args.changed:] = [scheduled._replace(best_of=5 if scheduled.best_of != 5 else 3)
+                                    for scheduled in schedule[-args.changed:]]
+        report['runs'].append(run(f'crawl {args.changed} changed', app_module.crawl_job))
+        report['runs'].append(run('crawl full', app_module.full_crawl_job))
+
+        unchanged = report['runs'][3]
+        assert unchanged['writes'] == 0 and unchanged['cache_bumps'] == 0 and report['runs'][1]['writes'] == 0
+        assert report['runs'][4]['upserted'] == args.changed
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Multi-league crawl benchmark: MatchesManager.crawl() over --leagues leagues with stand-in browsers that take
+a fixed per-league page load time and return a synthetic schedule page, no chrome needed. Compares one
+league at a time against the bounded pool, with and without a browser cap below the league count.
+
+    python benchmarks/bench_crawl.py --leagues 6 --matches 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fixtures import schedule_page  # noqa: E402
+
+
+class FakeBrowser:
+    """page loads sleep for the league's latency; the schedule is already 'rendered' when get() returns"""
+
+    def __init__(self, pages, latency):
+        self.pages = pages
+        self.latency = latency
+        self.page_source = ''
+
+    def get(self, url):
+        league = url.rsplit('=', 1)[-1]
+        time.sleep(self.latency[league])
+        self.page_source = self.pages[league]
+
+    def find_element(self, by, value):
+        return True
+
+    def quit(self):
+        pass
+
+
+def timed_crawl(leagues, pages, latency, workers, browsers):
+    from matches_manager import BrowserPool, MatchesManager
+    with tempfile.TemporaryDirectory() as directory:
+        manager = MatchesManager(leagues, snapshot_dir=directory, workers=workers, browsers=browsers,
+                                 interval=0)
+        manager.browsers = BrowserPool(browsers, factory=lambda: FakeBrowser(pages, latency))
+        start = time.perf_counter()
+        schedule = manager.crawl()
+        elapsed = time.perf_counter() - start
+        manager.close()
+        return schedule, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leagues', type=int, default=6)
+    parser.add_argument('--matches', type=int, default=200, help='matches per league page')
+    parser.add_argument('--min-latency', type=float, default=0.5)
+    parser.add_argument('--max-latency', type=float, default=1.5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    leagues = [f'league{i}' for i in range(args.leagues)]
+    pages = {league: schedule_page(args.matches, seed=i) for i, league in enumerate(leagues)}
+    latency = {league: rng.uniform(args.min_latency, args.max_latency) for league in leagues}
+
+    report = {'leagues': args.leagues, 'matches_per_league': args.matches,
+              'sum_latency_s': round(sum(latency.values()), 3), 'max_latency_s': round(max(latency.values()), 3)}
+    expected = None
+    for name, workers, browsers in (('sequential', 1, 1), ('pooled', args.leagues, args.leagues),
+                                    ('pooled_2_browsers', args.leagues, 2)):
+        schedule, elapsed = timed_crawl(leagues, pages, latency, workers, browsers)
+        assert {match.league for match in schedule} == set(leagues)
+        expected = expected or len(schedule)
+        assert len(schedule) == expected
+        report[f'{name}_s'] = round(elapsed, 3)
+    report['crawled_matches'] = expected
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
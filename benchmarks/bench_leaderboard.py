@@ -0,0 +1,118 @@
+"""
+Leaderboard / bet history benchmark: --users users and --bets bets (plus one heavy user with --heavy-bets bets)
+are generated in SQL, then the first page and deep pages are read through LeaderboardManager (keyset cursors)
+and, for comparison, with LIMIT/OFFSET. Keyset reads should stay flat however deep the page.
+
+    python benchmarks/bench_leaderboard.py --users 100000 --bets 2000000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def seed(bind, args):
+    """bulk bets take user n % users and match n // users, so every (user, match) pair is unique"""
+    from sqlalchemy import text
+    matches = max(args.bets // args.users + 1, args.heavy_bets)
+    heavy_user = args.users + 1
+    with bind.begin() as connection:
+        connection.execute(text("INSERT INTO teams (id, name, tricode, img_url) VALUES (1, 'A', 'A', ''), "
+                                "(2, 'B', 'B', '')"))
+        connection.execute(text('WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :n) '
+                                "INSERT INTO matches (id, datetime, best_of, team1_id, team2_id, result) "
+                                "SELECT n, 'match ' || n, 3, 1, 2, 'A' FROM seq"), {'n': matches})
+        connection.execute(text('WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :n) '
+                                "INSERT INTO users (id, number, facebook_name, token_balance, profit) "
+                                "SELECT n, n, 'user ' || n, abs(random() % 100000) / 100.0, "
+                                "(random() % 100000) / 100.0 FROM seq"), {'n': heavy_user})
+        connection.execute(text('WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < :n) '
+                                'INSERT INTO bets (datetime, user_team, amount, user_id, match_id, payout, settled_at) '
+                                "SELECT 'bet ' || n, 'A', 1 + n % 10, n % :users + 1, n / :users + 1, 0, "
+                                "'2023-05-01 00:00:00' FROM seq"), {'n': args.bets - 1, 'users': args.users})
+        connection.execute(text('WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :n) '
+                                'INSERT INTO bets (datetime, user_team, amount, user_id, match_id) '
+                                "SELECT 'heavy ' || n, 'A', 1, :user_id, n FROM seq"),
+                           {'n': args.heavy_bets, 'user_id': heavy_user})
+    return heavy_user
+
+
+def median_ms(read, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--bets', type=int, default=2000000)
+    parser.add_argument('--heavy-bets', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-leaderboard.db'
+        from classes import Base
+        from database import make_engine
+        from leaderboard_manager import LeaderboardManager, rankings
+        from sqlalchemy import text
+
+        bind = make_engine(os.environ['DATABASE_URL'])
+        Base.metadata.create_all(bind)
+        start = time.perf_counter()
+        heavy_user = seed(bind, args)
+        seed_elapsed = time.perf_counter() - start
+        with bind.connect() as connection:
+            connection.execute(text('ANALYZE'))
+        manager = LeaderboardManager(bind)
+        report = {'users': args.users, 'bets': args.bets + args.heavy_bets, 'heavy_user_bets': args.heavy_bets,
+                  'seed_s': round(seed_elapsed, 1), 'leaderboard': {}, 'history': {}}
+
+        with bind.connect() as connection:
+            for by, column in rankings.items():
+                offset_sql = text(f'SELECT id, facebook_name, token_balance, profit FROM users '
+                                  f'WHERE {column} IS NOT NULL ORDER BY {column} DESC, id DESC '
+                                  f'LIMIT :limit OFFSET :offset')
+                results = {'top_keyset_ms': median_ms(lambda: manager.leaderboard(by), args.repeat)}
+                for page in (10, 100, args.users // manager.page_size - 1):
+                    # the cursor a reader paging down would hold when asking for this page
+                    offset = page * manager.page_size
+                    last = connection.execute(offset_sql, {'limit': 1, 'offset': offset - 1}).one()
+                    cursor = f'{getattr(last, column)!r}:{last.id}:{offset}'
+                    ranked, _ = manager.leaderboard(by, cursor)
+                    assert ranked[0][0] == offset + 1
+                    assert [row.id for _, row in ranked] == [row.id for row in connection.execute(
+                        offset_sql, {'limit': manager.page_size, 'offset': offset})]
+                    results[f'page_{page}_keyset_ms'] = median_ms(lambda: manager.leaderboard(by, cursor),
+                                                                  args.repeat)
+                    results[f'page_{page}_offset_ms'] = median_ms(lambda: connection.execute(
+                        offset_sql, {'limit': manager.page_size, 'offset': offset}).all(), args.repeat)
+                report['leaderboard'][by] = results
+
+            offset_sql = text('SELECT id FROM bets WHERE user_id = :user_id ORDER BY id DESC '
+                              'LIMIT :limit OFFSET :offset')
+            history = {'newest_keyset_ms': median_ms(lambda: manager.history(heavy_user), args.repeat)}
+            for page in (10, 100, args.heavy_bets // manager.history_size - 1):
+                offset = page * manager.history_size
+                before = connection.execute(offset_sql, {'user_id': heavy_user, 'limit': 1,
+                                                         'offset': offset - 1}).scalar()
+                history[f'page_{page}_keyset_ms'] = median_ms(lambda: manager.history(heavy_user, before), args.repeat)
+                history[f'page_{page}_offset_ms'] = median_ms(lambda: connection.execute(
+                    offset_sql, {'user_id': heavy_user, 'limit': manager.history_size, 'offset': offset}).all(),
+                    args.repeat)
+            report['history'] = history
+
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
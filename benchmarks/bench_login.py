@@ -0,0 +1,106 @@
+"""
+Login storm benchmark: --login-clients clients sign in over and over while --readers logged-in clients load
+/matches, all through the Flask test client in one process (the threads of one gthread worker). Each setup runs
+in its own process since the settings are read at import: hashing in the request thread with no user cache
+(HASH_WORKERS=0, USER_CACHE_TTL=0), against the hashing pool and the load_user cache. Reports logins/s and
+/matches p50/p95/p99, alone and during the storm.
+
+    python benchmarks/bench_login.py --login-clients 16 --readers 4 --duration 10 --hash-workers 2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic  # noqa: E402
+from bench_app import summarize  # noqa: E402
+
+
+def load(app, readers, login_clients, duration):
+    """output: (login latencies, /matches latencies, errors, wall seconds) of one run"""
+    def sign_in(http, user_id):
+        return http.post('/login', data={'number': 9000000 + user_id, 'password': synthetic.password})
+
+    reader_clients = [app.test_client() for _ in range(readers)]
+    for user_id, http in enumerate(reader_clients, 1):
+        assert sign_in(http, user_id).status_code == 302
+    logins, reads, errors = [], [], []
+    barrier = threading.Barrier(readers + login_clients + 1)
+
+    def timed(http, request, latencies, expected, deadline):
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            began = time.perf_counter()
+            response = request(http)
+            latencies.append(time.perf_counter() - began)
+            if response.status_code != expected:
+                errors.append(response.status_code)
+
+    deadline = [float('inf')]
+    threads = [threading.Thread(target=timed, args=(http, lambda http: http.get('/matches'), reads, 200, deadline))
+               for http in reader_clients]
+    threads += [threading.Thread(target=timed, args=(app.test_client(), lambda http, user_id=user_id: sign_in(
+        http, user_id), logins, 302, deadline)) for user_id in range(readers + 1, readers + login_clients + 1)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return logins, reads, len(errors), time.perf_counter() - start
+
+
+def child(args):
+    """one setup, with whatever HASH_WORKERS and USER_CACHE_TTL the parent set"""
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-login.db'
+        os.environ['RUN_JOBS'] = '0'
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        app_module.app.config['WTF_CSRF_ENABLED'] = False
+        args.users, args.fresh_users = args.readers + args.login_clients, 0
+        synthetic.generate(app_module, args)
+
+        # warm up: the hashing pool's processes and the matches page cache
+        load(app_module.app, args.readers, min(args.login_clients, 2), 1)
+        _, quiet, _, elapsed = load(app_module.app, args.readers, 0, args.duration / 2)
+        logins, reads, errors, storm_elapsed = load(app_module.app, args.readers, args.login_clients, args.duration)
+        app_module.password_manager.close()
+        print(json.dumps({'matches_alone': summarize(quiet, elapsed),
+                          'matches_during_storm': summarize(reads, storm_elapsed),
+                          'logins': summarize(logins, storm_elapsed), 'errors': errors}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    synthetic.add_arguments(parser)
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--hash-workers', type=int, default=2)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.set_defaults(matches=200, bets=2000)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    report = {'cpus': os.cpu_count(), 'login_clients': args.login_clients, 'readers': args.readers}
+    for name, settings in (('inline_uncached', {'HASH_WORKERS': '0', 'USER_CACHE_TTL': '0'}),
+                           ('pool_cached', {'HASH_WORKERS': str(args.hash_workers), 'USER_CACHE_TTL': '5'})):
+        output = subprocess.run([sys.executable, __file__, '--child'] + sys.argv[1:], check=True, text=True,
+                                capture_output=True, env={**os.environ, **settings, 'LOG_LEVEL': 'WARNING'})
+        report[name] = json.loads(output.stdout.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
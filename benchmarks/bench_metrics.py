@@ -0,0 +1,81 @@
+"""
+Instrumentation overhead benchmark: the same requests (cached anonymous pages and the SQL-backed leaderboard)
+through the Flask test client, in one process with METRICS=0 and one with METRICS=1, so the hooks and engine
+events are installed or not exactly as in production. Reports the median per-request time of each and the
+difference; the instrumented run also checks that /metrics reports the routes it served.
+
+    python benchmarks/bench_metrics.py --requests 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic  # noqa: E402
+
+routes = ('/matches', '/view-match/1', '/leaderboard')
+
+
+def child(args):
+    """one measured run, with whatever METRICS the parent set"""
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-metrics.db'
+        os.environ['RUN_JOBS'] = '0'
+        os.environ['METRICS_DIR'] = os.path.join(directory, 'metrics')
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        synthetic.generate(app_module, args)
+        client = app_module.app.test_client()
+
+        report = {'metrics': app_module.metrics_manager.enabled}
+        for route in routes:
+            for _ in range(args.warmup):
+                assert client.get(route).status_code == 200
+            timings = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                client.get(route)
+                timings.append(time.perf_counter() - start)
+            report[route] = round(statistics.median(timings) * 1e6, 1)
+        if app_module.metrics_manager.enabled:
+            exposition = client.get('/metrics').get_data(as_text=True)
+            assert all(f'route="{rule}"' in exposition for rule in ('/matches', '/view-match/<int:match_id>'))
+            report['exposition_lines'] = exposition.count('\n')
+        app_module.engine.dispose()
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    synthetic.add_arguments(parser)
+    parser.set_defaults(matches=50, users=10000, bets=0, past=0)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    runs = {}
+    for metrics in ('0', '1'):
+        output = subprocess.run([sys.executable, __file__, '--child'] + sys.argv[1:], check=True, text=True,
+                                capture_output=True, env={**os.environ, 'METRICS': metrics, 'LOG_LEVEL': 'WARNING'})
+        runs[metrics] = json.loads(output.stdout.strip().splitlines()[-1])
+    report = {'requests_per_route': args.requests, 'median_us': {}}
+    for route in routes:
+        off, on = runs['0'][route], runs['1'][route]
+        report['median_us'][route] = {'off': off, 'on': on, 'overhead': round(on - off, 1)}
+    report['exposition_lines'] = runs['1']['exposition_lines']
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Odds engine benchmark: vectorized generate_odds_batch against the per-pair generate_odds loop, and a full
+reprice_matches() (one query, one vectorized call, one bulk UPDATE) on a synthetic schedule.
+
+    python benchmarks/bench_odds.py --matches 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=50000)
+    parser.add_argument('--teams', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-odds.db'
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_main
+        from sqlalchemy import insert
+
+        rng = random.Random(0)
+        ranks1 = [rng.uniform(1, 19) for _ in range(args.matches)]
+        ranks2 = [rng.uniform(1, 19) for _ in range(args.matches)]
+        manager = app_main.matches_manager
+        results = {'matches': args.matches}
+
+        start = time.perf_counter()
+        for pr1, pr2 in zip(ranks1, ranks2):
+            manager.generate_odds(pr1, pr2)
+        results['per_pair_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        manager.generate_odds_batch(ranks1, ranks2)
+        results['batch_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+        kickoff = datetime.now() + timedelta(days=1)
+        with app_main.engine.begin() as connection:
+            connection.execute(insert(app_main.Team), [{'id': i, 'name': f'Team {i}', 'tricode': f'T{i}', 'img_url': '',
+                                                        'power_rank': rng.uniform(1, 19)}
+                                                       for i in range(1, args.teams + 1)])
+            connection.execute(insert(app_main.Match), [{'id': i, 'datetime': f'match {i}', 'kickoff': kickoff,
+                                                         'best_of': 3, 'team1_id': rng.randint(1, args.teams),
+                                                         'team2_id': rng.randint(1, args.teams),
+                                                         'team1_odds': 0, 'team2_odds': 0}
+                                                        for i in range(1, args.matches + 1)])
+
+        with app_main.app.app_context():
+            start = time.perf_counter()
+            updated = app_main.reprice_matches()
+            results['reprice_all_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            results['reprice_all_updated'] = updated
+
+            start = time.perf_counter()
+            updated = app_main.reprice_matches()
+            results['reprice_unchanged_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            results['reprice_unchanged_updated'] = updated
+
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Schedule parsing benchmark: saves synthetic schedule pages of growing size and replays them through
+MatchesManager, once per available parser backend. Time per match should stay flat as pages grow. Saved
+crawl snapshots (real rendered pages, see SNAPSHOT_DIR) can be replayed the same way with --snapshots.
+
+    python benchmarks/bench_parser.py --sizes 100 1000 10000
+    python benchmarks/bench_parser.py --sizes --snapshots snapshots/*.html
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import matches_manager  # noqa: E402
+from fixtures import write_schedule_page  # noqa: E402
+
+
+def backends():
+    available = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        available.append('lxml')
+    except ImportError:
+        pass
+    return available
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100, 1000, 10000])
+    parser.add_argument('--snapshots', nargs='*', default=[], help='saved schedule pages to replay as well')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_dir = directory
+        manager = matches_manager.MatchesManager(snapshot_dir=snapshot_dir)
+        pages = [(write_schedule_page(os.path.join(snapshot_dir, f'schedule-{size}.html'), size), size)
+                 for size in args.sizes] + [(path, None) for path in args.snapshots]
+        results = []
+        for path, size in pages:
+            for backend in backends():
+                matches_manager.html_parser = backend
+                best = float('inf')
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    schedule = manager.replay(path)
+                    teams = manager.generate_ranking(schedule)
+                    best = min(best, time.perf_counter() - start)
+                assert size is None or len(schedule) == size
+                results.append({'page': os.path.basename(path), 'matches': len(schedule), 'backend': backend,
+                                'teams': len(teams), 'ms': round(best * 1000, 2),
+                                'us_per_match': round(best * 1e6 / max(len(schedule), 1), 1)})
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Live odds benchmark: reading a match's parimutuel odds from the running totals (match_pools) against summing
+its bets on every read, as the match's bet count grows to 100k. The running totals are also checked
+against a rebuild from the bets table.
+
+    python benchmarks/bench_pools.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+naive_sql = ('SELECT user_team, SUM(amount) FROM bets WHERE match_id = :match_id GROUP BY user_team')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--reads', type=int, default=500)
+    parser.add_argument('--live-bets', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-pools.db'
+        from classes import Base
+        from database import make_engine
+        from bets_manager import BetsManager
+        from pool_manager import PoolManager
+        from sqlalchemy import text
+
+        bind = make_engine(os.environ['DATABASE_URL'])
+        Base.metadata.create_all(bind)
+        pools = PoolManager(bind)
+        bets = BetsManager(bind)
+        rng = random.Random(0)
+        largest = max(args.sizes)
+        with bind.begin() as connection:
+            connection.execute(text("INSERT INTO teams (id, name, tricode, img_url) VALUES (1, 'Blue', 'BLU', ''), "
+                                    "(2, 'Red', 'RED', '')"))
+            connection.execute(text("INSERT INTO matches (id, datetime, kickoff, best_of, team1_id, team2_id, "
+                                    "team1_odds, team2_odds) "
+                                    "VALUES (1, 'match 1', '2999-01-01 00:00:00.000000', 3, 1, 2, 1.8, 2.1)"))
+            connection.execute(text('INSERT INTO users (id, number, token_balance) VALUES (:id, :id, 1000)'),
+                               [{'id': i} for i in range(1, largest + args.live_bets + 1)])
+
+        results, placed = [], 0
+        for size in sorted(args.sizes):
+            # bulk-load the bets, then bring the running totals up to date with a rebuild
+            with bind.begin() as connection:
+                connection.execute(text('INSERT INTO bets (datetime, user_team, amount, user_id, match_id) '
+                                        'VALUES (:dt, :team, :amount, :user_id, 1)'),
+                                   [{'dt': f'bet {user_id}', 'team': rng.choice(('Blue', 'Red')),
+                                     'amount': rng.randint(1, 20), 'user_id': user_id}
+                                    for user_id in range(placed + 1, size + 1)])
+            placed = size
+            pools.rebuild()
+
+            start = time.perf_counter()
+            for _ in range(args.reads):
+                pools.pool_odds([1])
+            pool_read = (time.perf_counter() - start) / args.reads
+
+            with bind.connect() as connection:
+                start = time.perf_counter()
+                for _ in range(args.reads // 10):
+                    connection.execute(text(naive_sql), {'match_id': 1}).all()
+                naive_read = (time.perf_counter() - start) / (args.reads // 10)
+
+            results.append({'bets': size, 'odds': pools.pool_odds([1])[1], 'pool_read_us': round(pool_read * 1e6, 1),
+                            'sum_bets_read_us': round(naive_read * 1e6, 1)})
+
+        # further bets arrive through BetsManager, which keeps the running totals as it writes them
+        start = time.perf_counter()
+        for user_id in range(placed + 1, placed + args.live_bets + 1):
+            bets.place_bet(user_id, 1, rng.choice(('Blue', 'Red')), rng.randint(1, 20))
+        results.append({'live_bets': args.live_bets,
+                        'place_bet_us': round((time.perf_counter() - start) / args.live_bets * 1e6, 1),
+                        'drift_after_live_bets': len(pools.check())})
+
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
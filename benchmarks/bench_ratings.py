@@ -0,0 +1,95 @@
+"""
+Power-rank fitting benchmark: a synthetic multi-season history (--results decided best-of-1, 3 and 5 series
+between --teams teams with hidden true per-game strengths) is rated with RatingManager.fit(), then one more
+result is folded in with update(). Reports timings (database read and write included) and how well the fit
+recovers the per-game strengths: a correlation and a slope near 1.
+
+    python benchmarks/bench_ratings.py --teams 300 --results 30000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def seed(bind, args):
+    from sqlalchemy import text
+    rng = np.random.default_rng(0)
+    strengths = np.exp(rng.normal(0, 1, args.teams))
+    team1 = rng.integers(0, args.teams, args.results + 1)
+    team2 = (team1 + rng.integers(1, args.teams, args.results + 1)) % args.teams
+    best_of = rng.choice((1, 3, 5), args.results + 1)
+    side1_wins = rng.binomial(best_of, strengths[team1] / (strengths[team1] + strengths[team2])) >= (best_of + 1) // 2
+    with bind.begin() as connection:
+        connection.execute(text('INSERT INTO teams (id, name, tricode, img_url) VALUES (:id, :name, :name, \'\')'),
+                           [{'id': i + 1, 'name': f'Team {i + 1}'} for i in range(args.teams)])
+        # the last match is left undecided, update() records it later
+        connection.execute(text('INSERT INTO matches (id, datetime, best_of, team1_id, team2_id, result) '
+                                'VALUES (:id, :dt, :best_of, :t1, :t2, :result)'),
+                           [{'id': i + 1, 'dt': f'match {i + 1}', 'best_of': int(best_of[i]),
+                             't1': int(team1[i]) + 1, 't2': int(team2[i]) + 1,
+                             'result': None if i == args.results else
+                             f'Team {int(team1[i] if side1_wins[i] else team2[i]) + 1}'}
+                            for i in range(args.results + 1)])
+    last = args.results
+    winner = int(team1[last] if side1_wins[last] else team2[last]) + 1
+    return strengths, args.results + 1, f'Team {winner}'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=300)
+    parser.add_argument('--results', type=int, default=30000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-ratings.db'
+        from classes import Base
+        from database import make_engine
+        from rating_manager import RatingManager, fit_bradley_terry
+        from sqlalchemy import text
+
+        bind = make_engine(os.environ['DATABASE_URL'])
+        Base.metadata.create_all(bind)
+        strengths, last_match, last_winner = seed(bind, args)
+        manager = RatingManager(bind)
+
+        start = time.perf_counter()
+        ranks = manager.fit()
+        fit_elapsed = time.perf_counter() - start
+        _, fit_iterations = fit_bradley_terry(manager.winners, manager.losers, manager.best_of, len(manager.team_ids),
+                                              centers=manager.centers, prior=manager.prior)
+
+        with bind.begin() as connection:
+            connection.execute(text('UPDATE matches SET result = :result WHERE id = :id'),
+                               {'result': last_winner, 'id': last_match})
+        previous = manager.strengths.copy()
+        start = time.perf_counter()
+        manager.update([last_match])
+        update_elapsed = time.perf_counter() - start
+        _, update_iterations = fit_bradley_terry(manager.winners, manager.losers, manager.best_of,
+                                                 len(manager.team_ids), previous, manager.centers, prior=manager.prior)
+
+        with bind.connect() as connection:
+            stored = dict(connection.execute(text('SELECT id, power_rank FROM teams')).all())
+        fitted = np.log([manager.strengths[manager.index[i + 1]] for i in range(args.teams)])
+        true = np.log(strengths)
+        assert len(ranks) == args.teams and all(stored[i + 1] is not None for i in range(args.teams))
+
+        print(json.dumps({'teams': args.teams, 'results': args.results,
+                          'fit_ms': round(fit_elapsed * 1000, 2), 'fit_iterations': fit_iterations,
+                          'update_ms': round(update_elapsed * 1000, 2), 'update_iterations': update_iterations,
+                          'log_strength_correlation': round(float(np.corrcoef(fitted, true)[0, 1]), 4),
+                          'log_strength_slope': round(float(np.polyfit(true - true.mean(), fitted - fitted.mean(),
+                                                                       1)[0]), 4)},
+                         indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Series pricing benchmark: closed-form series probabilities for a whole schedule, the Monte Carlo series
+simulator checked against the closed form, and full-bracket simulations at 100k+ iterations.
+
+    python benchmarks/bench_series.py --matches 50000 --iterations 100000 --brackets 16 32 64
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pricing import series_win_probability, simulate_bracket, simulate_series  # noqa: E402
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=50000)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--brackets', type=int, nargs='+', default=[16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    p = rng.uniform(0.2, 0.8, args.matches)
+    best_of = rng.choice([1, 3, 5], args.matches)
+    results = {}
+
+    closed, elapsed = timed(series_win_probability, p, best_of)
+    results['closed_form'] = {'matches': args.matches, 'ms': round(elapsed * 1000, 2)}
+
+    sample = slice(0, 100)
+    simulated, elapsed = timed(simulate_series, p[sample], best_of[sample], iterations=args.iterations, seed=1)
+    results['monte_carlo_series'] = {'matches': 100, 'iterations': args.iterations, 'ms': round(elapsed * 1000, 2),
+                                     'max_abs_error': round(float(np.abs(simulated - closed[sample]).max()), 4)}
+
+    results['brackets'] = []
+    for teams in args.brackets:
+        strengths = rng.uniform(0.1, 0.9, teams)
+        champions, elapsed = timed(simulate_bracket, strengths, best_of=3, iterations=args.iterations, seed=2)
+        results['brackets'].append({'teams': teams, 'iterations': args.iterations, 'ms': round(elapsed * 1000, 2),
+                                    'brackets_per_second': round(args.iterations / elapsed),
+                                    'probability_total': round(float(champions.sum()), 6)})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
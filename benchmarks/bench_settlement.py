@@ -0,0 +1,66 @@
+"""
+Settlement benchmark: a synthetic match day (see synthetic.py: --matches upcoming matches, --bets bets spread
+over --users users with empty balances) gets a result for every match and is settled in one
+SettlementManager.settle() call; a second call checks that nothing is paid twice.
+
+    python benchmarks/bench_settlement.py --bets 100000 --matches 10 --users 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    synthetic.add_arguments(parser)
+    parser.set_defaults(bets=100000, matches=10, users=50000, past=0, fresh_users=0, balance=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f'sqlite:///{directory}/bench-settlement.db'
+        os.environ['RUN_JOBS'] = '0'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from database import engine
+        from schema import create_schema
+        create_schema(engine)
+        import main as app_module
+        from sqlalchemy import text
+
+        synthetic.generate(app_module, args)
+        rng = random.Random(args.seed)
+        with app_module.engine.connect() as connection:
+            sides = connection.execute(text(
+                'SELECT matches.id, team1.name, team2.name FROM matches '
+                'JOIN teams AS team1 ON team1.id = matches.team1_id JOIN teams AS team2 ON team2.id = matches.team2_id '
+                'WHERE matches.result IS NULL')).all()
+        results = {match_id: rng.choice((team1, team2)) for match_id, team1, team2 in sides}
+        manager = app_module.settlement_manager
+
+        start = time.perf_counter()
+        first = manager.settle(results)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        second = manager.settle(results)
+        repeat_elapsed = time.perf_counter() - start
+
+        with app_module.engine.connect() as connection:
+            credited = connection.execute(text('SELECT SUM(token_balance) FROM users')).scalar()
+        assert second['bets'] == 0 and abs(credited - first['paid']) < 1e-6
+        app_module.engine.dispose()
+
+    print(json.dumps({'bets': args.bets, 'matches': args.matches, 'users': args.users,
+                      'settled_bets': first['bets'], 'credited_users': first['users'],
+                      'paid': round(first['paid'], 2), 'settle_ms': round(elapsed * 1000, 2),
+                      'resettle_ms': round(repeat_elapsed * 1000, 2)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Startup benchmark: how long a fresh interpreter takes to import the app (what every gunicorn worker boot and
+respawn pays), as the median of --runs cold processes against an already migrated database. Also lists the
+slowest top-level imports (python -X importtime) and whether any crawler-only module got loaded.
+--against REV measures the tree at another git revision the same way, for a before/after comparison.
+
+    python benchmarks/bench_startup.py --runs 20 --against HEAD~1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+crawler_modules = ('selenium', 'webdriver_manager', 'bs4', 'lxml')
+probe = ('import sys, main; '
+         f'print(",".join(name for name in {crawler_modules!r} if name in sys.modules))')
+
+
+def import_times(tree, env, runs):
+    """output: wall seconds of each cold `import main` in tree, and the crawler modules it loaded"""
+    timings, loaded = [], ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', probe], cwd=tree, env=env, check=True, text=True,
+                                capture_output=True)
+        timings.append(time.perf_counter() - start)
+        loaded = output.stdout.strip()
+    return timings, [name for name in loaded.split(',') if name]
+
+
+def slowest_imports(tree, env, count):
+    """the app's direct imports by cumulative import time, from -X importtime"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=tree, env=env, check=True,
+                            text=True, capture_output=True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('   ') and not name.startswith('    '):  # imported by main itself
+            modules.append((int(cumulative), name.strip()))
+    return {name: round(microseconds / 1000, 1) for microseconds, name in sorted(modules, reverse=True)[:count]}
+
+
+def export(revision, tree):
+    """unpack the tree at a git revision into the (empty) directory tree"""
+    archive = subprocess.run(['git', 'archive', revision], cwd=root, check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', tree], input=archive, check=True)
+
+
+def measure(tree, database, runs, count):
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{database}', 'RUN_JOBS': '0', 'LOG_LEVEL': 'WARNING'}
+    import_times(tree, env, 1)  # writes the bytecode caches and warms the OS file cache
+    timings, loaded = import_times(tree, env, runs)
+    return {'median_ms': round(statistics.median(timings) * 1000, 1), 'min_ms': round(min(timings) * 1000, 1),
+            'crawler_modules_loaded': loaded, 'slowest_imports_ms': slowest_imports(tree, env, count)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--against', help='git revision to compare with, e.g. HEAD~1')
+    parser.add_argument('--top', type=int, default=8, help='how many of the slowest imports to list')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # one migrated database for both trees: the current schema is a superset of any older one
+        database = os.path.join(directory, 'bench-startup.db')
+        subprocess.run([sys.executable, 'migrate.py'], cwd=root, check=True,
+                       env={**os.environ, 'DATABASE_URL': f'sqlite:///{database}'})
+
+        report = {'runs': args.runs, 'current': measure(root, database, args.runs, args.top)}
+        if args.against:
+            with tempfile.TemporaryDirectory() as tree:
+                export(args.against, tree)
+                report[args.against] = measure(tree, database, args.runs, args.top)
+            report['speedup'] = round(report[args.against]['median_ms'] / report['current']['median_ms'], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
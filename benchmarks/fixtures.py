@@ -0,0 +1,54 @@
+"""
+Synthetic lolesports schedule pages with the same markup the crawler selects on, for offline parsing
+benchmarks and replay runs: date headers followed by that day's .EventMatch nodes.
+"""
+import random
+
+team_pool = [('GAM Esports', 'GAM'), ('DetonatioN FocusMe', 'DFM'), ('Golden Guardians', 'GG'), ('T1', 'T1'),
+             ('Gen.G', 'GEN'), ('JD Gaming', 'JDG'), ('Bilibili Gaming', 'BLG'), ('G2 Esports', 'G2'),
+             ('MAD Lions', 'MAD'), ('Cloud9', 'C9'), ('PSG Talon', 'PSG'), ('LOUD', 'LLL'), ('TBD', 'TBD')]
+months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+
+
+def team_html(side, team):
+    name, tricode = team
+    logo = 'https://am-a.akamaihd.net/image?f=team-tbd.png' if name == 'TBD' else \
+        f'https://am-a.akamaihd.net/image?f=static.lolesports.com%2Fteams%2F{tricode}.png'
+    return (f'<div class="team {side}"><div class="team-info"><h2><span class="name">{name}</span>'
+            f'<span class="tricode">{tricode}</span></h2></div><img class="image" src="{logo}"></div>')
+
+
+def match_html(hour, team1, team2, best_of, approx=False):
+    approx_html = '<span class="approx">APPROX</span>' if approx else ''
+    return (f'<div class="EventMatch"><div class="event future"><div class="EventTime"><div class="time">'
+            f'{approx_html}<span class="hour">{hour}</span><span class="ampm">PM</span></div></div>'
+            f'<div class="teams">{team_html("team1", team1)}{team_html("team2", team2)}</div>'
+            f'<div class="league"><div class="name">MSI</div><div class="strategy">Best of {best_of}</div></div>'
+            f'</div></div>')
+
+
+def date_html(month, day):
+    return (f'<div class="EventDate"><div class="date"><span class="weekday">Day</span>'
+            f'<span class="separator">–</span><span class="monthday">{month} {day}</span></div></div>')
+
+
+def schedule_page(number_of_matches, matches_per_day=4, seed=0):
+    """output: html of a schedule with number_of_matches upcoming matches"""
+    rng = random.Random(seed)
+    parts = ['<html><body><div class="Schedule">']
+    for index in range(number_of_matches):
+        if index % matches_per_day == 0:
+            day = index // matches_per_day
+            parts.append(date_html(months[(day // 28) % 12], day % 28 + 1))
+        team1, team2 = rng.sample(team_pool, 2)
+        parts.append(match_html(index % matches_per_day + 5, team1, team2, rng.choice((1, 3, 5)),
+                                approx=index % 7 == 0))
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def write_schedule_page(path, number_of_matches, **kwargs):
+    with open(path, 'w', encoding='utf-8') as page:
+        page.write(schedule_page(number_of_matches, **kwargs))
+    return path
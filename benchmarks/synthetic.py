@@ -0,0 +1,129 @@
+"""
+Synthetic octobet database at a configurable scale, built with the app's own models: --teams ranked teams,
+--matches matches (--past of them already played, settled and with results, the rest upcoming and priced),
+--users users who all share one password, and --bets bets spread over them. The lowest --fresh-users user ids
+get no bets on upcoming matches, so a load test logging in as them always has bets to place.
+
+    python benchmarks/synthetic.py --out /tmp/octobet-large.db --users 50000 --matches 4000 --bets 500000
+
+Generation is seeded (--seed), so the same arguments always give the same database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from matches_manager import kickoff_format  # noqa: E402
+
+password = 'octobet'  # every synthetic user's password
+
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--teams', type=int, default=40)
+    parser.add_argument('--matches', type=int, default=2000)
+    parser.add_argument('--past', type=float, default=0.5, help='share of the matches already played')
+    parser.add_argument('--leagues', type=int, default=4)
+    parser.add_argument('--bets', type=int, default=100000)
+    parser.add_argument('--fresh-users', type=int, default=100)
+    parser.add_argument('--balance', type=float, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def generate(app_module, args, batch=20000):
+    """fill the (empty, freshly created) database behind app_module.engine, output: a summary of what was made"""
+    from sqlalchemy import insert, text
+    from werkzeug.security import generate_password_hash
+    Team, Match, User, Bet, match_teams = (app_module.Team, app_module.Match, app_module.User, app_module.Bet,
+                                           app_module.match_teams)
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def chunks(rows):
+        for start in range(0, len(rows), batch):
+            yield rows[start:start + batch]
+
+    started = time.perf_counter()
+    teams = [{'id': i, 'name': f'Team {i}', 'tricode': f'T{i}', 'img_url': f'https://example.com/logos/T{i}.png',
+              'power_rank': rng.uniform(0, 10)} for i in range(1, args.teams + 1)]
+
+    past = int(args.matches * args.past)
+    matches, sides = [], []
+    for i in range(1, args.matches + 1):
+        league, slot = (i - 1) % args.leagues, (i - 1) // args.leagues
+        # played matches count back from now, upcoming ones forward, one per league per hour
+        kickoff = now + timedelta(hours=slot - past // args.leagues) + timedelta(minutes=30)
+        team1, team2 = rng.sample(teams, 2)
+        result = rng.choice((team1, team2))['name'] if i <= past and kickoff < now else None
+        matches.append({'id': i, 'league': f'league{league}', 'datetime': kickoff.strftime(kickoff_format),
+                        'kickoff': kickoff, 'result': result, 'best_of': rng.choice((1, 3, 5)),
+                        'team1_id': team1['id'], 'team2_id': team2['id'], 'team1_odds': 0, 'team2_odds': 0})
+        sides.append({'match_id': i, 'team_id': team1['id']})
+        sides.append({'match_id': i, 'team_id': team2['id']})
+    names = {team['id']: team['name'] for team in teams}
+
+    # one hash for everyone: hashing each user's password would dominate generation time
+    hashed = generate_password_hash(password, method='pbkdf2:sha256', salt_length=8)
+    users = [{'id': i, 'number': 9000000 + i, 'password': hashed, 'facebook_name': f'User {i}',
+              'token_balance': args.balance, 'profit': 0} for i in range(1, args.users + 1)]
+
+    bets, taken = [], set()
+    upcoming = [match for match in matches if match['result'] is None]
+    attempts = 0
+    while len(bets) < args.bets and attempts < args.bets * 3:
+        attempts += 1
+        match = rng.choice(matches)
+        lowest = 1 if match['result'] is not None else args.fresh_users + 1
+        if lowest > args.users:
+            continue
+        user_id = rng.randint(lowest, args.users)
+        if (user_id, match['id']) in taken:
+            continue
+        taken.add((user_id, match['id']))
+        bets.append({'datetime': f'synthetic {len(bets)}', 'user_team': names[rng.choice(
+            (match['team1_id'], match['team2_id']))], 'amount': rng.randint(1, 20), 'user_id': user_id,
+            'match_id': match['id']})
+
+    session = app_module.session
+    for model, rows in ((Team, teams), (Match, matches), (match_teams, sides), (User, users), (Bet, bets)):
+        for rows_batch in chunks(rows):
+            session.execute(insert(model), rows_batch)
+    session.commit()
+
+    # price the upcoming matches the way /combine does, then settle the played ones and seed the pools
+    app_module.reprice_matches()
+    with app_module.engine.begin() as connection:
+        connection.execute(text('UPDATE matches SET team1_odds = 1.9, team2_odds = 1.9 WHERE result IS NOT NULL'))
+    settled = app_module.settlement_manager.settle()  # the results are already stored
+    app_module.pool_manager.rebuild()
+    with app_module.engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+    app_module.session.remove()
+    return {'teams': len(teams), 'matches': len(matches), 'upcoming': len(upcoming), 'users': len(users),
+            'bets': len(bets), 'settled': settled, 'seconds': round(time.perf_counter() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', required=True, help='database file to create (must not exist)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.out):
+        parser.error(f'{args.out} already exists')
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.out)}'
+    os.environ['RUN_JOBS'] = '0'
+    from database import engine
+    from schema import create_schema
+    create_schema(engine)
+    import main as app_module
+    print(json.dumps(generate(app_module, args), indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.exc import DBAPIError
+
+from pool_manager import live_odds, record_stake_sql
+
+
+logger = logging.getLogger('octobet.bets')
+
+bet_time_format = "%m/%d/%Y, %H:%M:%S.%f"
+max_batch_size = 64
+max_batch_wait = 0.0  # extra seconds a batch stays open after the first bet; 0 takes whatever is already queued
+
+# betting on a match closes at kickoff or once its result is in
+open_match_sql = text('SELECT 1 FROM matches WHERE id = :match_id AND result IS NULL AND kickoff > :now'
+                      ).bindparams(bindparam('now', type_=DateTime))
+
+# the balance check, the match check and the debit are one statement, so two concurrent bets can never both
+# spend the same tokens and no bet gets in after settlement
+debit_sql = text('UPDATE users SET token_balance = token_balance - :amount '
+                 'WHERE id = :user_id AND token_balance >= :amount '
+                 'AND NOT EXISTS (SELECT 1 FROM bets WHERE user_id = :user_id AND match_id = :match_id) '
+                 'AND EXISTS (SELECT 1 FROM matches WHERE id = :match_id AND result IS NULL AND kickoff > :now)'
+                 ).bindparams(bindparam('now', type_=DateTime))
+# the bet keeps its side's odds as they are when it is written, so repricing never moves an open bet's payout;
+# with live odds they're left NULL and the bet settles at the odds frozen at settlement
+insert_bet_sql = text('INSERT INTO bets (datetime, user_team, amount, user_id, match_id, odds) '
+                      'SELECT :datetime, :user_team, :amount, :user_id, :match_id, CASE WHEN NOT :lock_odds THEN NULL '
+                      'WHEN :user_team = team1.name THEN NULLIF(matches.team1_odds, 0) '
+                      'WHEN :user_team = team2.name THEN NULLIF(matches.team2_odds, 0) END '
+                      'FROM matches LEFT JOIN teams AS team1 ON team1.id = matches.team1_id '
+                      'LEFT JOIN teams AS team2 ON team2.id = matches.team2_id WHERE matches.id = :match_id')
+insert_user_bet_sql = text('INSERT INTO user_bets (user_id, bet_id) VALUES (:user_id, :bet_id)')
+insert_match_bet_sql = text('INSERT INTO match_bets (match_id, bet_id) VALUES (:match_id, :bet_id)')
+existing_bet_sql = text('SELECT 1 FROM bets WHERE user_id = :user_id AND match_id = :match_id')
+
+
+class BetRejected(Exception):
+    """raised when a bet is refused: insufficient balance, an existing bet, or betting on the match is closed"""
+
+
+class PendingBet:
+    def __init__(self, user_id, match_id, user_team, amount):
+        self.params = {'user_id': user_id, 'match_id': match_id, 'user_team': user_team, 'amount': amount}
+        self.bet_id = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BetsManager:
+    """
+    Group-commit bet ingestion: request threads submit bets to a queue and wait, a single writer thread
+    drains the queue into batches and writes each batch in one short transaction (one fsync per batch).
+    """
+
+    def __init__(self, bind, batch_size=max_batch_size, batch_wait=max_batch_wait, lock_odds=not live_odds):
+        self.bind = bind
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.lock_odds = lock_odds
+        self.queue = queue.Queue()
+        self.writer = None
+        self.writer_lock = threading.Lock()
+
+    def place_bet(self, user_id, match_id, user_team, amount, timeout=30):
+        """input: bet details, output: new bet id once committed; raises BetRejected if it was refused"""
+        pending = PendingBet(user_id, match_id, user_team, amount)
+        self.start()
+        self.queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError('bet was not written in time')
+        if pending.error:
+            raise pending.error
+        return pending.bet_id
+
+    def start(self):
+        """start the writer thread the first time a bet comes in (after gunicorn has forked the worker)"""
+        if self.writer is None or not self.writer.is_alive():
+            with self.writer_lock:
+                if self.writer is None or not self.writer.is_alive():
+                    self.writer = threading.Thread(target=self.run, name='bet-writer', daemon=True)
+                    self.writer.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        """
+        write a batch in one transaction; if the transaction fails, fall back to one transaction per bet. Any
+        other error fails the bets it hit instead of the writer thread, and every waiting request is answered
+        """
+        try:
+            with self.bind.begin() as connection:
+                for pending in batch:
+                    self.write_bet(connection, pending)
+        except DBAPIError:
+            for pending in batch:
+                pending.bet_id, pending.error = None, None
+                try:
+                    with self.bind.begin() as connection:
+                        self.write_bet(connection, pending)
+                except DBAPIError as error:
+                    pending.bet_id, pending.error = None, error
+                except Exception as error:
+                    logger.exception('bet write failed: user %s, match %s', pending.params['user_id'],
+                                     pending.params['match_id'])
+                    pending.bet_id, pending.error = None, error
+        except Exception as error:
+            # the batch's transaction was rolled back, so none of its bets were written
+            logger.exception('bet batch of %d failed', len(batch))
+            for pending in batch:
+                pending.bet_id, pending.error = None, error
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def write_bet(self, connection, pending):
+        now = datetime.now()
+        params = dict(pending.params, datetime=now.strftime(bet_time_format), now=now, lock_odds=self.lock_odds)
+        if connection.execute(debit_sql, params).rowcount != 1:
+            if connection.execute(existing_bet_sql, params).first():
+                pending.error = BetRejected('You already have a bet on this match')
+            elif not connection.execute(open_match_sql, params).first():
+                pending.error = BetRejected('Betting on this match is closed')
+            else:
+                pending.error = BetRejected('Insufficient token balance')
+            return
+        pending.bet_id = connection.execute(insert_bet_sql, params).lastrowid
+        connection.execute(insert_user_bet_sql, dict(params, bet_id=pending.bet_id))
+        connection.execute(insert_match_bet_sql, dict(params, bet_id=pending.bet_id))
+        connection.execute(record_stake_sql, params)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+cache_max_entries = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+cache_ttl = float(os.environ.get('CACHE_TTL', 60))  # seconds an entry lives even if the schedule doesn't change
+version_ttl = float(os.environ.get('CACHE_VERSION_TTL', 1))  # how often a worker re-reads the shared version
+user_cache_ttl = float(os.environ.get('USER_CACHE_TTL', 5))  # seconds a logged-in user's row is reused, 0: off
+
+init_version_sql = text('INSERT OR IGNORE INTO schedule_versions (id, version, updated_at) VALUES (1, 0, :now)')
+read_version_sql = text('SELECT version, updated_at FROM schedule_versions WHERE id = 1')
+bump_version_sql = text('UPDATE schedule_versions SET version = version + 1, updated_at = :now WHERE id = 1')
+
+
+class CachedPage:
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.md5(body.encode('utf-8')).hexdigest()
+        self.last_modified = datetime.utcnow().replace(microsecond=0)
+
+
+class LRUCache:
+    """thread-safe LRU map with a per-entry deadline, evicting the least recently used entry past max_entries"""
+
+    def __init__(self, max_entries=cache_max_entries, ttl=cache_ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, deadline = entry
+            if deadline <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        """expires_at (epoch seconds) can only shorten the default ttl, e.g. to the next kickoff"""
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self.lock:
+            self.entries[key] = (value, deadline)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ScheduleCache:
+    """
+    Query results and rendered pages for the schedule, keyed on a schedule version kept in the database so
+    every worker process sees a bump. Each worker re-reads the version at most every version_ttl seconds,
+    so cache hits cost no query at all; the routes that change the schedule call bump().
+    """
+
+    def __init__(self, bind, max_entries=cache_max_entries, ttl=cache_ttl, refresh=version_ttl):
+        self.bind = bind
+        self.entries = LRUCache(max_entries, ttl)
+        self.refresh = refresh
+        self.current = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def version(self):
+        """output: (version, updated_at) of the schedule, re-read from the database every `refresh` seconds"""
+        if self.current is None or time.monotonic() - self.checked_at > self.refresh:
+            with self.bind.connect() as connection:
+                row = connection.execute(read_version_sql).first()
+            if row is None:
+                with self.bind.begin() as connection:
+                    connection.execute(init_version_sql, {'now': datetime.utcnow()})
+                    row = connection.execute(read_version_sql).first()
+            with self.lock:
+                self.current, self.checked_at = tuple(row), time.monotonic()
+        return self.current
+
+    def bump(self):
+        """mark the schedule as changed: every worker's entries for the old version stop matching"""
+        with self.bind.begin() as connection:
+            connection.execute(init_version_sql, {'now': datetime.utcnow()})
+            connection.execute(bump_version_sql, {'now': datetime.utcnow()})
+        self.entries.clear()
+        with self.lock:
+            self.current = None
+
+    def get(self, key):
+        return self.entries.get((self.version()[0],) + key)
+
+    def set(self, key, value, expires_at=None):
+        return self.entries.set((self.version()[0],) + key, value, expires_at)
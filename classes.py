@@ -1,8 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
+"""the database models, shared by the web app, the job worker, the crawler and migrate.py"""
+from flask_login import UserMixin
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy import Column, Integer, String, Table, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Table, ForeignKey, Float, DateTime, Index
 
-db = SQLAlchemy()
 Base = declarative_base()
 
 match_teams = Table('match_teams', Base.metadata,
@@ -24,13 +24,23 @@ user_bets = Table('user_bets', Base.metadata,
 class Match(Base):
     __tablename__ = 'matches'
     id = Column(Integer, primary_key=True)
-    datetime = Column(String, unique=True, nullable=False)
+    league = Column(String)  # league slug the match was crawled from, e.g. msi
+    datetime = Column(String, nullable=False)
+    kickoff = Column(DateTime, index=True)
     result = Column(String)
     best_of = Column(Integer, nullable=False)
 
+    # denormalized sides of match_teams, so a crawl can upsert a match in one row
+    team1_id = Column(Integer, ForeignKey('teams.id'))
+    team2_id = Column(Integer, ForeignKey('teams.id'))
+
     team1_odds = Column(Float)
     team2_odds = Column(Float)
 
+    # leagues can play at the same hour, so a kickoff is only unique within a league; the crawled datetime
+    # string has no year, so it repeats every season
+    __table_args__ = (Index('uq_matches_league_kickoff', 'league', 'kickoff', unique=True),)
+
     teams = relationship("Team", secondary="match_teams", back_populates='matches_t')
     bets_m = relationship("Bet", secondary="match_bets", back_populates='matches_b')
 
@@ -42,6 +52,7 @@ class Team(Base):
     tricode = Column(String, nullable=False)
     img_url = Column(String(1000), nullable=False)
     power_rank = Column(Float)
+    seed_rank = Column(Float)  # operator-set power rank, the prior the fit pulls the team toward
 
     matches_t = relationship("Match", secondary="match_teams", back_populates='teams')
 
@@ -49,14 +60,28 @@ class Team(Base):
 class Bet(Base):
     __tablename__ = 'bets'
     id = Column(Integer, primary_key=True)
-    datetime = Column(String, unique=True, nullable=False)
+    datetime = Column(String, nullable=False)  # when it was placed, for display; bets are ordered by id
+    user_team = Column(String, nullable=False)
     amount = Column(Integer, nullable=False)
+    odds = Column(Float)  # the side's odds when the bet was placed, NULL with live odds or for older bets
+
+    # denormalized owner keys: one bet per user per match, enforced by the database
+    user_id = Column(Integer, ForeignKey('users.id'))
+    match_id = Column(Integer, ForeignKey('matches.id'))
+
+    # filled in by SettlementManager: tokens paid back (0 for a losing bet) and when
+    payout = Column(Float)
+    settled_at = Column(DateTime)
+
+    __table_args__ = (Index('uq_bets_user_match', 'user_id', 'match_id', unique=True),
+                      Index('ix_bets_open', 'match_id', 'user_id', sqlite_where=settled_at.is_(None)),
+                      Index('ix_bets_user_history', 'user_id', 'id'))
 
     matches_b = relationship("Match", secondary="match_bets", back_populates='bets_m')
     users_b = relationship("User", secondary="user_bets", back_populates='bets_u')
 
 
-class User(Base):
+class User(Base, UserMixin):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
     number = Column(Integer, unique=True, nullable=False)
@@ -64,4 +89,59 @@ class User(Base):
     facebook_name = Column(String(1000))
     token_balance = Column(Float)
 
+    # settled payouts minus settled stakes, credited by SettlementManager along with token_balance
+    profit = Column(Float, default=0)
+
+    __table_args__ = (Index('ix_users_token_balance', 'token_balance', 'id'),
+                      Index('ix_users_profit', 'profit', 'id'))
+
     bets_u = relationship("Bet", secondary="user_bets", back_populates='users_b')
+
+
+class ScheduleVersion(Base):
+    """single row, bumped whenever /rank, /crawl or /combine change what the schedule pages show"""
+    __tablename__ = 'schedule_versions'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+class Job(Base):
+    """a background job (crawl, rank, reprice, teams) queued by a route and run by JobsManager's worker"""
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False)  # queued, running, done or failed
+    requested_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration = Column(Float)  # seconds
+    detail = Column(String)  # JSON from the job's handler: counts and per-phase seconds
+    error = Column(String)
+
+    __table_args__ = (Index('ix_jobs_status', 'status', 'id'),
+                      Index('ix_jobs_kind', 'kind', 'requested_at'))
+
+
+class LeagueFetch(Base):
+    """when a league's schedule page may next be loaded, shared by every process that crawls (LEAGUE_INTERVAL)"""
+    __tablename__ = 'league_fetches'
+    league = Column(String, primary_key=True)
+    next_fetch = Column(Float, nullable=False)  # unix time
+
+
+class Fingerprint(Base):
+    """last-seen content hash of a crawled match or team, see FingerprintManager"""
+    __tablename__ = 'fingerprints'
+    kind = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    hash = Column(String, nullable=False)
+
+
+class MatchPool(Base):
+    """running stake total per match and side (team name), kept by BetsManager for parimutuel odds"""
+    __tablename__ = 'match_pools'
+    match_id = Column(Integer, ForeignKey('matches.id'), primary_key=True)
+    team = Column(String, primary_key=True)
+    stake = Column(Float, nullable=False, default=0)
+    bets = Column(Integer, nullable=False, default=0)
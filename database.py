@@ -0,0 +1,47 @@
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+database_url = os.environ.get('DATABASE_URL', 'sqlite:///octobet-2023.db')
+
+# connection pool, per worker process
+pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+pool_timeout = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+pool_recycle = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+
+# sqlite tuning: WAL lets readers run alongside a writer, NORMAL only fsyncs at checkpoints,
+# busy_timeout makes a blocked writer wait for the lock instead of failing straight away
+sqlite_journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+sqlite_synchronous = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+sqlite_busy_timeout = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """apply the journal/sync/lock pragmas to every new sqlite connection in the pool"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA journal_mode={sqlite_journal_mode}')
+    cursor.execute(f'PRAGMA synchronous={sqlite_synchronous}')
+    cursor.execute(f'PRAGMA busy_timeout={sqlite_busy_timeout}')
+    cursor.close()
+
+
+def make_engine(url=database_url):
+    """create a pooled engine for url, with the sqlite pragmas hooked in when it is a sqlite database"""
+    if url.startswith('sqlite'):
+        new_engine = create_engine(url, future=True, echo=False, pool_size=pool_size, max_overflow=max_overflow,
+                                   pool_timeout=pool_timeout, pool_recycle=pool_recycle,
+                                   connect_args={"check_same_thread": False, "timeout": sqlite_busy_timeout / 1000})
+        event.listen(new_engine, 'connect', set_sqlite_pragmas)
+    else:
+        new_engine = create_engine(url, future=True, echo=False, pool_size=pool_size, max_overflow=max_overflow,
+                                   pool_timeout=pool_timeout, pool_recycle=pool_recycle, pool_pre_ping=True)
+    return new_engine
+
+
+engine = make_engine()
+
+# one session per thread, handed out per request and removed again in the app teardown
+session = scoped_session(sessionmaker(bind=engine, future=True))
@@ -0,0 +1,61 @@
+import hashlib
+
+from sqlalchemy import text
+
+
+stored_sql = text('SELECT key, hash FROM fingerprints WHERE kind = :kind')
+record_sql = text('INSERT INTO fingerprints (kind, key, hash) VALUES (:kind, :key, :hash) '
+                  'ON CONFLICT (kind, key) DO UPDATE SET hash = excluded.hash')
+clear_sql = text('DELETE FROM fingerprints')
+clear_kind_sql = text('DELETE FROM fingerprints WHERE kind = :kind')
+
+
+def fingerprint(*values):
+    """content hash of a crawled row's fields"""
+    return hashlib.sha1('\x1f'.join(str(value) for value in values).encode('utf-8')).hexdigest()
+
+
+def match_key(scheduled):
+    """league and kickoff: the crawled datetime string has no year, so it alone would collide across seasons"""
+    return f'{scheduled.league}|{scheduled.kickoff.isoformat()}'
+
+
+def match_fingerprint(scheduled):
+    """the fields upsert_matches writes; team logos and tricodes are the team fingerprint's business"""
+    return fingerprint(scheduled.best_of, scheduled.team1, scheduled.team2)
+
+
+def team_fingerprint(team):
+    return fingerprint(team.tricode, team.img_url)
+
+
+class FingerprintManager:
+    """
+    Last-seen content hashes of crawled rows (kind 'match' or 'team', keyed by the row's natural key). A crawl
+    compares its rows against them and only the delta goes on to the database and the cache; the hashes of
+    what was persisted are recorded afterwards, so a row that couldn't be written is retried next time.
+    An unchanged recrawl is one read per kind and no writes.
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+
+    def changed(self, kind, hashes):
+        """input: {key: hash} for this crawl, output: the entries whose hash differs from the last recorded one"""
+        with self.bind.connect() as connection:
+            stored = dict(connection.execute(stored_sql, {'kind': kind}).all())
+        return {key: value for key, value in hashes.items() if stored.get(key) != value}
+
+    def record(self, kind, hashes):
+        if hashes:
+            with self.bind.begin() as connection:
+                connection.execute(record_sql, [{'kind': kind, 'key': key, 'hash': value}
+                                                for key, value in hashes.items()])
+
+    def clear(self, kind=None):
+        """forget the recorded hashes (of one kind), so the next crawl persists everything again"""
+        with self.bind.begin() as connection:
+            if kind is None:
+                connection.execute(clear_sql)
+            else:
+                connection.execute(clear_kind_sql, {'kind': kind})
@@ -0,0 +1,29 @@
+import multiprocessing
+import os
+
+# gthread workers: each worker process serves several requests at once, each thread with its own db session
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# import the app once in the master and fork the workers from it, so worker boots and respawns skip the import;
+# importing the app opens no connections and starts no threads (the bet writer and job runner start per worker)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    """
+    publish the worker count (-w included) to the workers, which split the cores between their password
+    hashing pools by it; and clear the previous run's per-process metrics files, which would otherwise stay
+    in /metrics forever
+    """
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    from metrics_manager import clear_metrics
+    clear_metrics()
+
+
+def post_fork(server, worker):
+    """drop any pooled connection inherited from the master: a sqlite connection must not cross a fork"""
+    from database import engine
+    engine.dispose(close=False)
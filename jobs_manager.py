@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text, DateTime
+
+
+job_interval = float(os.environ.get('JOB_INTERVAL', 0))  # seconds between scheduled crawl jobs, 0 turns it off
+job_poll = float(os.environ.get('JOB_POLL', 1))  # how often an idle worker looks for queued jobs
+job_timeout = float(os.environ.get('JOB_TIMEOUT', 900))  # a job running longer than this is marked abandoned
+job_max_backoff = float(os.environ.get('JOB_MAX_BACKOFF', 60))  # longest wait after repeated worker loop errors
+run_jobs = os.environ.get('RUN_JOBS', '1') == '1'  # 0: web processes only enqueue, worker.py runs the jobs
+
+logger = logging.getLogger('octobet.jobs')
+
+# a kind is queued at most once: asking again while it waits returns the waiting job
+enqueue_sql = text("INSERT INTO jobs (kind, status, requested_at) SELECT :kind, 'queued', :now "
+                   "WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = :kind AND status = 'queued')"
+                   ).bindparams(bindparam('now', type_=DateTime))
+queued_sql = text("SELECT id FROM jobs WHERE kind = :kind AND status = 'queued' ORDER BY id LIMIT 1")
+
+# the interval check and the insert are one statement, so only one process schedules each run
+schedule_sql = text("INSERT INTO jobs (kind, status, requested_at) SELECT :kind, 'queued', :now "
+                    "WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = :kind AND requested_at > :since)"
+                    ).bindparams(bindparam('now', type_=DateTime), bindparam('since', type_=DateTime))
+
+pending_sql = text("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1")
+
+# claiming is one conditional UPDATE, so two workers never run the same job, and an exclusive kind (the crawls,
+# which start browsers) is skipped while any exclusive job runs in any process
+claim_sql = text("UPDATE jobs SET status = 'running', started_at = :now "
+                 "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND (kind NOT IN :exclusive "
+                 "OR NOT EXISTS (SELECT 1 FROM jobs WHERE status = 'running' AND kind IN :exclusive)) "
+                 "ORDER BY id LIMIT 1) "
+                 "RETURNING id, kind").bindparams(bindparam('now', type_=DateTime),
+                                                  bindparam('exclusive', expanding=True))
+finish_sql = text('UPDATE jobs SET status = :status, finished_at = :now, duration = :duration, detail = :detail, '
+                  'error = :error WHERE id = :job_id').bindparams(bindparam('now', type_=DateTime))
+reap_sql = text("UPDATE jobs SET status = 'failed', error = 'abandoned', finished_at = :now "
+                "WHERE status = 'running' AND started_at < :cutoff"
+                ).bindparams(bindparam('now', type_=DateTime), bindparam('cutoff', type_=DateTime))
+
+job_columns = 'SELECT id, kind, status, requested_at, started_at, finished_at, duration, detail, error FROM jobs '
+job_sql = text(job_columns + 'WHERE id = :job_id')
+recent_jobs_sql = text(job_columns + 'ORDER BY id DESC LIMIT :limit')
+
+
+def job_dict(row):
+    job = dict(row._mapping)
+    job['detail'] = json.loads(job['detail']) if job['detail'] else None
+    return job
+
+
+class JobsManager:
+    """
+    Background jobs kept in the jobs table: routes enqueue() and return at once, a worker thread (one per
+    process, started on the first request) claims queued jobs one at a time and runs their handler. Handlers
+    return a dict of details (counts, per-phase seconds) that is stored with the job's status and duration.
+    With an interval set, the worker also queues the scheduled kind every `interval` seconds. At most one job of
+    the `exclusive` kinds runs at a time across every process sharing the database.
+    """
+
+    def __init__(self, bind, handlers, cleanup=None, interval=job_interval, scheduled_kind='crawl',
+                 poll=job_poll, timeout=job_timeout, exclusive=()):
+        self.bind = bind
+        self.handlers = handlers
+        self.exclusive = list(exclusive)
+        self.cleanup = cleanup
+        self.interval = interval
+        self.scheduled_kind = scheduled_kind
+        self.poll = poll
+        self.timeout = timeout
+        self.worker = None
+        self.worker_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.next_schedule = 0.0
+
+    def enqueue(self, kind):
+        """input: job kind, output: id of the queued job (an already waiting job of that kind is reused)"""
+        if kind not in self.handlers:
+            raise ValueError(f'unknown job kind {kind!r}')
+        with self.bind.begin() as connection:
+            connection.execute(enqueue_sql, {'kind': kind, 'now': datetime.now()})
+            job_id = connection.execute(queued_sql, {'kind': kind}).scalar()
+        self.wakeup.set()
+        return job_id
+
+    def job(self, job_id):
+        with self.bind.connect() as connection:
+            row = connection.execute(job_sql, {'job_id': job_id}).first()
+        return job_dict(row) if row else None
+
+    def recent(self, limit=50):
+        with self.bind.connect() as connection:
+            return [job_dict(row) for row in connection.execute(recent_jobs_sql, {'limit': limit})]
+
+    def start(self):
+        """start the worker thread once per process (after gunicorn has forked the worker)"""
+        if self.worker is None or not self.worker.is_alive():
+            with self.worker_lock:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self.run, name='job-worker', daemon=True)
+                    self.worker.start()
+
+    def run(self):
+        """
+        the worker loop. An iteration that fails (e.g. 'database is locked' while claiming or finishing a job) is
+        logged and retried after a backoff that doubles up to JOB_MAX_BACKOFF, instead of ending the thread; a
+        job left running that way is marked abandoned after JOB_TIMEOUT
+        """
+        failures = 0
+        while True:
+            try:
+                self.schedule()
+                ran = self.run_next()
+            except Exception:
+                failures += 1
+                backoff = min(max(self.poll, 1) * 2 ** (failures - 1), job_max_backoff)
+                logger.exception('job worker loop failed (%d in a row), retrying in %.0fs', failures, backoff)
+                time.sleep(backoff)
+                continue
+            failures = 0
+            if not ran:
+                self.wakeup.wait(self.poll)
+                self.wakeup.clear()
+
+    def schedule(self):
+        """queue the scheduled kind if it hasn't been requested within the interval (checked once a minute at most)"""
+        if self.interval > 0 and time.monotonic() >= self.next_schedule:
+            self.next_schedule = time.monotonic() + min(self.interval, 60)
+            now = datetime.now()
+            with self.bind.begin() as connection:
+                connection.execute(schedule_sql, {'kind': self.scheduled_kind, 'now': now,
+                                                  'since': now - timedelta(seconds=self.interval)})
+
+    def run_next(self):
+        """claim and run the oldest queued job, output: its id, or None when nothing was queued"""
+        # an idle poll is one indexed read, the write transaction only starts when there is work
+        with self.bind.connect() as connection:
+            if connection.execute(pending_sql).first() is None:
+                return None
+        now = datetime.now()
+        with self.bind.begin() as connection:
+            connection.execute(reap_sql, {'now': now, 'cutoff': now - timedelta(seconds=self.timeout)})
+            claimed = connection.execute(claim_sql, {'now': now, 'exclusive': self.exclusive}).first()
+        if claimed is None:
+            return None
+
+        job_id, kind = claimed
+        start = time.perf_counter()
+        status, detail, error = 'done', None, None
+        try:
+            detail = self.handlers[kind]()
+        except Exception as exception:
+            status, error = 'failed', repr(exception)
+        finally:
+            if self.cleanup:
+                self.cleanup()
+        duration = time.perf_counter() - start
+        with self.bind.begin() as connection:
+            connection.execute(finish_sql, {'job_id': job_id, 'status': status, 'now': datetime.now(),
+                                            'duration': duration, 'error': error,
+                                            'detail': json.dumps(detail) if detail is not None else None})
+        logger.info('job %s (%s) %s in %.2fs%s', job_id, kind, status, duration, f': {error}' if error else '')
+        return job_id
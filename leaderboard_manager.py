@@ -0,0 +1,83 @@
+import os
+
+from sqlalchemy import text
+
+
+leaderboard_page_size = int(os.environ.get('LEADERBOARD_PAGE_SIZE', 50))
+history_page_size = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+
+# users.token_balance and users.profit are kept current by the bet writer (debit) and settlement (credit),
+# so the leaderboard is a walk down one index: ix_users_token_balance or ix_users_profit
+rankings = {'balance': 'token_balance', 'profit': 'profit'}
+
+leaderboard_sql = {by: text(f'SELECT id, facebook_name, token_balance, profit FROM users '
+                            f'WHERE {column} IS NOT NULL ORDER BY {column} DESC, id DESC LIMIT :limit')
+                   for by, column in rankings.items()}
+leaderboard_after_sql = {by: text(f'SELECT id, facebook_name, token_balance, profit FROM users '
+                                  f'WHERE {column} IS NOT NULL AND ({column}, id) < (:value, :id) '
+                                  f'ORDER BY {column} DESC, id DESC LIMIT :limit')
+                         for by, column in rankings.items()}
+
+# newest first along ix_bets_user_history (user_id, id), one primary-key lookup into matches per row
+history_columns = ('SELECT bets.id, bets.datetime, bets.user_team, bets.amount, bets.payout, bets.settled_at, '
+                   'matches.id AS match_id, matches.datetime AS match_datetime, matches.result '
+                   'FROM bets JOIN matches ON matches.id = bets.match_id ')
+history_sql = text(history_columns + 'WHERE bets.user_id = :user_id ORDER BY bets.id DESC LIMIT :limit')
+history_before_sql = text(history_columns + 'WHERE bets.user_id = :user_id AND bets.id < :before '
+                                            'ORDER BY bets.id DESC LIMIT :limit')
+
+user_sql = text('SELECT id, facebook_name, token_balance, profit FROM users WHERE id = :user_id')
+
+
+class LeaderboardManager:
+    """
+    Leaderboard and bet history read with keyset pagination: each page starts where the last one ended, given
+    by a cursor holding the last row's sort key, so page 2000 costs the same index seek as page 1.
+    """
+
+    def __init__(self, bind, page_size=leaderboard_page_size, history_size=history_page_size):
+        self.bind = bind
+        self.page_size = page_size
+        self.history_size = history_size
+
+    def leaderboard(self, by='balance', after=None):
+        """
+        input: ranking ('balance' or 'profit') and the cursor of the previous page (None for the top),
+        output: ([(rank, row)], cursor of the next page or None); raises ValueError for a bad ranking or cursor
+        """
+        if by not in rankings:
+            raise ValueError(f'unknown ranking {by!r}')
+        with self.bind.connect() as connection:
+            if after is None:
+                rank = 0
+                rows = connection.execute(leaderboard_sql[by], {'limit': self.page_size}).all()
+            else:
+                value, user_id, rank = self.decode_cursor(after)
+                rows = connection.execute(leaderboard_after_sql[by], {'value': value, 'id': user_id,
+                                                                      'limit': self.page_size}).all()
+        ranked = [(rank + position, row) for position, row in enumerate(rows, start=1)]
+        cursor = None
+        if len(rows) == self.page_size:
+            last_rank, last = ranked[-1]
+            cursor = f'{getattr(last, rankings[by])!r}:{last.id}:{last_rank}'
+        return ranked, cursor
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """'value:user_id:rank' of the last row on the previous page"""
+        value, user_id, rank = cursor.split(':')
+        return float(value), int(user_id), int(rank)
+
+    def user(self, user_id):
+        with self.bind.connect() as connection:
+            return connection.execute(user_sql, {'user_id': user_id}).first()
+
+    def history(self, user_id, before=None):
+        """input: user id and the last bet id already shown (None for the newest), output: (bets, next cursor)"""
+        params = {'user_id': user_id, 'limit': self.history_size}
+        with self.bind.connect() as connection:
+            if before is None:
+                rows = connection.execute(history_sql, params).all()
+            else:
+                rows = connection.execute(history_before_sql, dict(params, before=int(before))).all()
+        return rows, (rows[-1].id if len(rows) == self.history_size else None)
@@ -1,40 +1,72 @@
-from flask import Flask, render_template, redirect, request, flash, url_for
+from flask import Flask, render_template, redirect, request, flash, url_for, abort, jsonify, make_response
 from flask_bootstrap import Bootstrap
-from flask_sqlalchemy import SQLAlchemy
 from matches_manager import MatchesManager
+from classes import Bet, Match, Team, User, match_teams
+from database import engine, session
+from bets_manager import BetsManager, BetRejected
+from settlement_manager import SettlementManager, void_result
+from cache_manager import CachedPage, LRUCache, ScheduleCache, user_cache_ttl
+from pool_manager import PoolManager, live_odds, live_odds_ttl
+from leaderboard_manager import LeaderboardManager, rankings
+from rating_manager import RatingManager, rank_strength
+from jobs_manager import JobsManager, run_jobs
+from metrics_manager import MetricsManager
+from password_manager import PasswordManager
+from fingerprint_manager import (FingerprintManager, match_fingerprint, match_key,
+                                 team_fingerprint)
 from math import floor
+import numpy as np
+import atexit
+import functools
+import logging
+import os
+import time
 from datetime import datetime
+from types import SimpleNamespace
 
 from flask_login import UserMixin, login_user, LoginManager, login_required, current_user, logout_user
-from werkzeug.security import generate_password_hash, check_password_hash
 
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, FloatField, SelectField, IntegerField
+from flask_wtf.csrf import CSRFProtect
+from wtforms import StringField, SubmitField, SelectField, IntegerField
 from wtforms.validators import DataRequired, NumberRange
 
-from sqlalchemy import create_engine, Column, Integer, String, Table, ForeignKey, Float
-from sqlalchemy.orm import declarative_base, relationship, Session
+from sqlalchemy import bindparam, exists, or_, select, tuple_, union, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased, selectinload
 
 
-db = SQLAlchemy()
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('octobet')
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///octobet-2023.db"
 app.config['SECRET_KEY'] = '8BYkEfBA6O6donzWlSihBXox7C0sKR6b'
 Bootstrap(app)
-db.init_app(app)
+# every POST needs the session's CSRF token: the forms carry it, other clients send it as an X-CSRFToken header
+csrf = CSRFProtect(app)
+
+# login numbers of the users allowed to record results and pay out bets, e.g. OPERATORS=9171234567,9179876543
+operators = {int(number) for number in os.environ.get('OPERATORS', '').split(',') if number.strip()}
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-matches_manager = MatchesManager()
-now = datetime.now()
-
-# Make the engine
-engine = create_engine("sqlite:///octobet-2023.db", future=True, echo=False, connect_args={"check_same_thread": False})
-
-# Make the DeclarativeMeta
-Base = declarative_base()
-
+matches_manager = MatchesManager(bind=engine)
+atexit.register(matches_manager.close)
+bets_manager = BetsManager(engine)
+settlement_manager = SettlementManager(engine)
+schedule_cache = ScheduleCache(engine)
+pool_manager = PoolManager(engine)
+leaderboard_manager = LeaderboardManager(engine)
+rating_manager = RatingManager(engine)
+fingerprint_manager = FingerprintManager(engine)
+password_manager = PasswordManager()
+atexit.register(password_manager.close)
+user_cache = LRUCache(ttl=user_cache_ttl)
+metrics_manager = MetricsManager()
+metrics_manager.instrument_app(app)
+metrics_manager.instrument_engine(engine)
 
 # TODO: matches and view-matches route html formatting
 
@@ -59,85 +91,49 @@ class BetForm(FlaskForm):
     submit = SubmitField("Let's go!")
 
 
-# Declare Classes / Tables
-match_teams = Table('match_teams', Base.metadata,
-                    Column('match_id', ForeignKey('matches.id'), primary_key=True),
-                    Column('team_id', ForeignKey('teams.id'), primary_key=True)
-                    )
-
-match_bets = Table('match_bets', Base.metadata,
-                   Column('match_id', ForeignKey('matches.id'), primary_key=True),
-                   Column('bet_id', ForeignKey('bets.id'), primary_key=True)
-                   )
-
-user_bets = Table('user_bets', Base.metadata,
-                  Column('user_id', ForeignKey('users.id'), primary_key=True),
-                  Column('bet_id', ForeignKey('bets.id'), primary_key=True)
-                  )
-
-
-class Match(Base):
-    __tablename__ = 'matches'
-    id = Column(Integer, primary_key=True)
-    datetime = Column(String, unique=True, nullable=False)
-    result = Column(String)
-    best_of = Column(Integer, nullable=False)
-
-    team1_odds = Column(Float)
-    team2_odds = Column(Float)
-
-    teams = relationship("Team", secondary="match_teams", back_populates='matches_t')
-    bets_m = relationship("Bet", secondary="match_bets", back_populates='matches_b')
-
-
-class Team(Base):
-    __tablename__ = 'teams'
-    id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-    tricode = Column(String, nullable=False)
-    img_url = Column(String(1000), nullable=False)
-    power_rank = Column(Float)
-
-    matches_t = relationship("Match", secondary="match_teams", back_populates='teams')
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """end the request's session, returning its connection to the pool and discarding any open transaction"""
+    session.remove()
 
 
-class Bet(Base):
-    __tablename__ = 'bets'
-    id = Column(Integer, primary_key=True)
-    datetime = Column(String, unique=True, nullable=False)
-    user_team = Column(String, nullable=False)
-    amount = Column(Integer, nullable=False)
-
-    matches_b = relationship("Match", secondary="match_bets", back_populates='bets_m')
-    users_b = relationship("User", secondary="user_bets", back_populates='bets_u')
-
-
-class User(Base, UserMixin):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    number = Column(Integer, unique=True, nullable=False)
-    password = Column(String(100))
-    facebook_name = Column(String(1000))
-    token_balance = Column(Float)
-
-    bets_u = relationship("Bet", secondary="user_bets", back_populates='users_b')
+@app.route('/')
+def home():
+    return render_template('index.html', logged_in=current_user.is_authenticated)
 
 
-# Create the tables in the database
-Base.metadata.create_all(engine)
+class CachedUser(UserMixin):
+    """plain, session-free copy of a User to serve as current_user, reused by a worker's requests for a few seconds"""
 
-with Session(bind=engine) as session:
-    pass
+    def __init__(self, user):
+        self.id = user.id
+        self.number = user.number
+        self.facebook_name = user.facebook_name
+        self.token_balance = user.token_balance
+        self.profit = user.profit
 
 
-@app.route('/')
-def home():
-    return render_template('index.html', logged_in=current_user.is_authenticated)
+def operator_required(view):
+    """like login_required, and the user must also be one of OPERATORS"""
+    @functools.wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.number not in operators:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return session.get(User, user_id)
+    """current_user from user_cache; a balance changed by another worker shows up within USER_CACHE_TTL seconds"""
+    user = user_cache.get(user_id)
+    if user is None:
+        row = session.get(User, int(user_id))
+        if row is None:
+            return None
+        user = user_cache.set(user_id, CachedUser(row))
+    return user
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -152,14 +148,13 @@ def register():
             flash('Number already in use, sign in instead', 'error')
             return redirect(url_for('login'))
 
-        # salt and hash pw
-        hashed_pw = generate_password_hash(form.password.data,
-                                           method='pbkdf2:sha256',
-                                           salt_length=8)
+        # salt and hash pw, in the hashing pool
+        hashed_pw = password_manager.hash(form.password.data)
         new_user.number = form.number.data
         new_user.facebook_name = form.name.data
         new_user.password = hashed_pw
         new_user.token_balance = 0
+        new_user.profit = 0
 
         session.add(new_user)
         session.commit()
@@ -185,8 +180,12 @@ def login():
             flash('Invalid credentials', 'error')
             return render_template("login.html", form=form)
 
-        # noinspection PyTypeChecker
-        if check_password_hash(user.password, password):
+        if password_manager.verify(user.password, password):
+            if password_manager.needs_rehash(user.password):
+                # stored at an older work factor: upgrade it while the password is at hand
+                user.password = password_manager.hash(password)
+                session.commit()
+            user_cache.pop(str(user.id))
             login_user(user)
             return redirect(url_for('home'))
 
@@ -203,34 +202,97 @@ def logout():
     return redirect(url_for('home'))
 
 
+def snapshot_match(match):
+    """plain, session-free copy of a match and its teams (team1 first) that can be cached and shared"""
+    order = {match.team1_id: 0, match.team2_id: 1}
+    teams = sorted(match.teams, key=lambda team: order.get(team.id, 2))
+    return SimpleNamespace(id=match.id, league=match.league, datetime=match.datetime, kickoff=match.kickoff,
+                           best_of=match.best_of, result=match.result, team1_odds=match.team1_odds,
+                           team2_odds=match.team2_odds,
+                           teams=[SimpleNamespace(id=team.id, name=team.name, tricode=team.tricode,
+                                                  img_url=team.img_url) for team in teams])
+
+
+def upcoming_matches():
+    """output: cached list of upcoming match snapshots; the entry expires when the first of them kicks off"""
+    show_list = schedule_cache.get(('upcoming',))
+    if show_list is None:
+        # future matches only, as an indexed range scan on kickoff, with both teams loaded in one extra query
+        show_list = [snapshot_match(match) for match in session.query(Match)
+                     .options(selectinload(Match.teams))
+                     .filter(Match.kickoff > datetime.now())
+                     .order_by(Match.kickoff, Match.id)]
+        schedule_cache.set(('upcoming',), show_list, expires_at=next_kickoff(show_list))
+    return show_list
+
+
+def cached_match(match_id):
+    match = schedule_cache.get(('match', match_id))
+    if match is None:
+        match = session.query(Match).options(selectinload(Match.teams)).filter_by(id=match_id).first()
+        if match is None:
+            abort(404)
+        match = schedule_cache.set(('match', match_id), snapshot_match(match))
+    return match
+
+
+def next_kickoff(match_list):
+    return match_list[0].kickoff.timestamp() if match_list else None
+
+
+def page_expiry(match_list):
+    """a cached page is stale at the next kickoff, or after a couple of seconds when it shows live pool odds"""
+    expires_at = next_kickoff(match_list)
+    if live_odds:
+        expires_at = min(expires_at or float('inf'), time.time() + live_odds_ttl)
+    return expires_at
+
+
+def with_live_odds(match_list):
+    """in live-odds mode, copies of the snapshots priced from the running stake totals"""
+    if not live_odds:
+        return match_list
+    odds = pool_manager.pool_odds(match.id for match in match_list)
+    return [SimpleNamespace(**dict(vars(match), team1_odds=odds[match.id][0], team2_odds=odds[match.id][1]))
+            if match.id in odds else match for match in match_list]
+
+
+def anonymous_page(key, render, expires_at=None):
+    """serve a page for logged-out visitors from the cache, with ETag/Last-Modified and 304s on revalidation"""
+    page = schedule_cache.get(key)
+    if page is None:
+        page = schedule_cache.set(key, CachedPage(render()), expires_at)
+    response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @app.route('/matches')
 def display_matches():
-    show_list = []
-    match_list = session.query(Match).order_by(Match.id).all()
-
-    # check match_list in Match.db for future matches
-    for match in match_list:
-        # noinspection PyTypeChecker
-        date_time_obj = datetime.strptime(match.datetime, '%B %d - %I %p')
-        date_time_obj = date_time_obj.replace(year=2023)
-        if date_time_obj > now:
-            show_list.append(match)
-    return render_template('matches.html', match_list=show_list, logged_in=current_user.is_authenticated)
+    show_list = upcoming_matches()
+    if not current_user.is_authenticated:
+        return anonymous_page(('page', 'matches'),
+                              lambda: render_template('matches.html', match_list=with_live_odds(show_list),
+                                                      logged_in=False),
+                              expires_at=page_expiry(show_list))
+    return render_template('matches.html', match_list=with_live_odds(show_list),
+                           logged_in=current_user.is_authenticated)
 
 
 @app.route('/view-match/<int:match_id>', methods=['GET', 'POST'])
 def single_match(match_id):
     form = BetForm()
-    match = session.query(Match).filter_by(id=match_id).first()
+    match = cached_match(match_id)
     active_bet = None
+    page_expires_at = page_expiry([match]) if match.kickoff else None
+    match = with_live_odds([match])[0]
 
     if current_user.is_authenticated:
-
-        # check if user has existing bet on this match
-        for bet in match.bets_m:
-            for user in bet.users_b:
-                if current_user.number == user.number:
-                    active_bet = bet
+        # check if user has existing bet on this match (unique index lookup)
+        active_bet = session.query(Bet).filter_by(user_id=current_user.id, match_id=match.id).first()
 
         if not active_bet:  # make new bet
             team_names = [team.name for team in match.teams]
@@ -241,22 +303,21 @@ def single_match(match_id):
                                                      message=f'Whole tokens only! (1 to {max_token} token/s)')]
 
             if form.validate_on_submit():
-                print('Bet accepted')
-                date_time = now.strftime("%m/%d/%Y, %H:%M:%S")
-
-                # affect user_balance
-                current_user.token_balance -= form.token_amt.data
-
-                # create new bet record in bets.db
-                new_bet = Bet(datetime=date_time, amount=form.token_amt.data, user_team=form.user_team.data)
-                new_bet.users_b = [current_user]
-                new_bet.matches_b = [match]
-
-                session.add(new_bet)
-                session.commit()
-
-                return redirect('/matches')
-                # TODO: redirect to user profile instead
+                # balance check, debit and insert happen in one conditional write, batched with other bets
+                try:
+                    bets_manager.place_bet(current_user.id, match.id, form.user_team.data, form.token_amt.data)
+                except BetRejected as rejection:
+                    flash(str(rejection), 'error')
+                    return redirect(url_for('single_match', match_id=match.id))
+                except (DBAPIError, TimeoutError):
+                    # the database stayed locked or the writer fell behind; a late bet still shows on the profile
+                    logger.exception('bet failed: user %s, match %s', current_user.id, match.id)
+                    flash('Your bet could not be placed right now, please try again', 'error')
+                    return redirect(url_for('single_match', match_id=match.id))
+                logger.info('bet accepted: user %s, match %s', current_user.id, match.id)
+                user_cache.pop(str(current_user.id))  # the balance just changed
+
+                return redirect(url_for('user_profile', user_id=current_user.id))
 
             else:
                 return render_template('view-match.html', match=match, logged_in=current_user.is_authenticated,
@@ -267,81 +328,360 @@ def single_match(match_id):
                                    form=form, active_bet=active_bet)
 
     else:
-        return render_template('view-match.html', match=match, logged_in=current_user.is_authenticated,
-                               form=form, active_bet=active_bet)
+        return anonymous_page(('page', 'view-match', match_id),
+                              lambda: render_template('view-match.html', match=match, logged_in=False, form=form,
+                                                      active_bet=active_bet),
+                              expires_at=page_expires_at)
+
+
+@app.route('/leaderboard')
+def leaderboard():
+    """users ranked by token balance (?by=balance) or profit (?by=profit), paged with ?after=<cursor>"""
+    by = request.args.get('by', 'balance')
+    try:
+        ranked, cursor = leaderboard_manager.leaderboard(by, request.args.get('after'))
+    except ValueError:
+        abort(400)
+    return render_template('leaderboard.html', ranked=ranked, by=by, rankings=rankings, cursor=cursor,
+                           logged_in=current_user.is_authenticated)
+
+
+@app.route('/profile')
+@login_required
+def profile():
+    return redirect(url_for('user_profile', user_id=current_user.id))
+
+
+@app.route('/users/<int:user_id>')
+def user_profile(user_id):
+    """a user's balance, profit and bet history, newest first, paged with ?before=<last bet id shown>"""
+    user = leaderboard_manager.user(user_id)
+    if user is None:
+        abort(404)
+    before = request.args.get('before', type=int)
+    bets, cursor = leaderboard_manager.history(user_id, before)
+    return render_template('profile.html', user=user, bets=bets, cursor=cursor,
+                           logged_in=current_user.is_authenticated)
 
 
 @app.route('/rank')
 @login_required
 def first_update():
-    """run this function to find teams, or update the power rank of teams, and update team database"""
-    team_list = session.query(Team).order_by(Team.id).all()
-    team_name_list = [team.name for team in team_list]
-    command = input('crawl/rank: ').lower()
-    if command == 'crawl':
-        # crawl lolesports for list of teams
-        print('No rating list found')
-        rating_list = matches_manager.generate_ranking()
-        for item in rating_list:
-            print(item.name, item.tricode)
-            if item.name not in team_name_list:
-                print('new team added')
-                session.add(item)
-        session.commit()
-        return redirect('/')
-    elif command == 'rank':
-        # ask input for power ranking of found teams
-        print('Team list found, no rating')
-        for team in team_list:
-            if team.power_rank is None:
-                team.power_rank = input(f'What is the power rank of {team.name}? ')
-                session.commit()
-        return redirect('/')
+    """
+    queue ?command=rank (the default: fit power ranks from the stored results and seeds, and reprice) or ?command=crawl
+    (find teams and add new ones to the team database)
+    """
+    command = request.args.get('command', 'rank').lower()
+    if command not in ('rank', 'crawl'):
+        abort(400)
+    return queued(jobs_manager.enqueue('teams' if command == 'crawl' else 'rank'))
+
+
+@app.route('/rank', methods=['POST'])
+@operator_required
+def seed_ranks():
+    """
+    set teams' seed ranks from a JSON object or form of {team name: power rank from 0 (best) to below 20, or
+    null to clear it}, then queue a rank job: a seeded team is priced at its seed until results move it. Like
+    every POST it needs the session's CSRF token (a csrf_token field or an X-CSRFToken header)
+    """
+    seeds = request.get_json(silent=True) or request.form.to_dict()
+    if not seeds or not isinstance(seeds, dict):
+        abort(400)
+    ranks = {}
+    for name, rank in seeds.items():
+        try:
+            ranks[name] = None if rank in (None, '') else float(rank)
+        except (TypeError, ValueError):
+            abort(400)
+        if ranks[name] is not None and not 0 < rank_strength(ranks[name]) <= 1:
+            abort(400)
+    teams = session.query(Team).filter(Team.name.in_(list(ranks))).all()
+    if {team.name for team in teams} != set(ranks):
+        abort(404)
+    for team in teams:
+        team.seed_rank = ranks[team.name]
+    session.commit()
+    logger.info('seed ranks set for %d teams', len(ranks))
+    return queued(jobs_manager.enqueue('rank'))
 
 
 @app.route('/crawl')
 @login_required
 def second_update():
-    """run this function to find list of displayed future matches, and update match database"""
-    match_list = session.query(Match).order_by(Match.id).all()
-
-    # crawl lolesports for list of future matches
-    try:
-        short_list = matches_manager.start_crawl()
-    except IndexError:
-        # handle error for when lolesports responds poorly
-        short_list = matches_manager.start_crawl()
-
-    finally:
-        # create new match records
-        for (dt, bo, team1, team2) in short_list:
-            t1 = session.query(Team).filter_by(name=team1).first()
-            t2 = session.query(Team).filter_by(name=team2).first()
-            if t1.name != t2.name:
-                new_match = Match(datetime=dt, result=None, best_of=bo, team1_odds=0, team2_odds=0)
-                new_match.teams = [t1, t2]
-                session.add(new_match)
-        session.commit()
-        return redirect('/')
+    """
+    queue a crawl of the displayed future matches: fetch, upsert the changed ones into the match database,
+    reprice; ?full=1 upserts every crawled match whether it changed or not
+    """
+    return queued(jobs_manager.enqueue('full-crawl' if request.args.get('full') else 'crawl'))
+
+
+def upsert_matches(short_list):
+    """
+    input: crawled ScheduledMatch list. Inserts new matches and updates existing ones (keyed on league and
+    kickoff) in one transaction; a row is only rewritten when its teams or best_of changed, which also resets
+    its odds so /combine reprices it, and never once it has a result. output: [(league, kickoff)] of the
+    matches written
+    """
+    team_ids = {}
+    for team_id, name in session.query(Team.id, Team.name).order_by(Team.id.desc()):
+        team_ids[name] = team_id  # lowest id wins for duplicate names, like filter_by(name=...).first()
+
+    rows = {}
+    for scheduled in short_list:
+        t1, t2 = team_ids.get(scheduled.team1), team_ids.get(scheduled.team2)
+        if t1 is not None and t2 is not None and t1 != t2:
+            kickoff = scheduled.kickoff
+            rows[scheduled.league, kickoff] = {
+                'league': scheduled.league, 'datetime': scheduled.datetime,
+                'kickoff': kickoff, 'best_of': scheduled.best_of,
+                'team1_id': t1, 'team2_id': t2, 'result': None, 'team1_odds': 0, 'team2_odds': 0}
+    if not rows:
+        return []
+
+    statement = insert(Match).values(list(rows.values()))
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=[Match.league, Match.kickoff],
+        set_={'datetime': excluded.datetime, 'best_of': excluded.best_of, 'team1_id': excluded.team1_id,
+              'team2_id': excluded.team2_id, 'team1_odds': 0, 'team2_odds': 0},
+        where=Match.result.is_(None) & or_(Match.best_of != excluded.best_of,
+                                           Match.team1_id.is_distinct_from(excluded.team1_id),
+                                           Match.team2_id.is_distinct_from(excluded.team2_id)))
+    session.execute(statement)
+
+    # bring match_teams in line with team1_id/team2_id for the crawled matches
+    def crawled_keys():
+        return tuple_(Match.league, Match.kickoff).in_(list(rows))  # a fresh expanding IN for each use
+
+    crawled = select(Match.id).where(crawled_keys())
+    sides = union(select(Match.id, Match.team1_id).where(crawled_keys()),
+                  select(Match.id, Match.team2_id).where(crawled_keys()))
+    session.execute(match_teams.delete()
+                    .where(match_teams.c.match_id.in_(crawled))
+                    .where(match_teams.c.team_id.not_in(
+                        select(Match.team1_id).where(Match.id == match_teams.c.match_id)
+                        .union_all(select(Match.team2_id).where(Match.id == match_teams.c.match_id)))))
+    session.execute(match_teams.insert().prefix_with('OR IGNORE')
+                    .from_select(['match_id', 'team_id'], sides))
+    session.commit()
+    schedule_cache.bump()
+    return list(rows)
 
 
 @app.route('/combine')
 @login_required
 def third_update():
-    """run this function to generate odds and update match database"""
-    match_list = session.query(Match).order_by(Match.id).all()
-    for match in match_list:
-        if match.team1_odds == 0:
-            t1, t2 = match.teams
-            if t1.name == 'TBD' or t2.name == 'TBD':
-                match.team1_odds = None
-                match.team2_odds = None
-            else:
-                match.team1_odds, match.team2_odds = matches_manager.generate_odds(t1.power_rank, t2.power_rank)
-            print(f'{match.datetime} - {t1.name, match.team1_odds} vs {t2.name, match.team2_odds}')
-            session.commit()
+    """queue a repricing of the match database"""
+    return queued(jobs_manager.enqueue('reprice'))
+
+
+def reprice_matches():
+    """
+    price every unsettled upcoming (or never priced) match in one vectorized call and write the ones whose
+    odds changed in one bulk UPDATE, output: number of matches updated. Bets keep the odds they were placed at,
+    so this never moves an open bet's payout; when they don't (live odds), matches with open bets are left alone
+    """
+    team1, team2 = aliased(Team), aliased(Team)
+    query = (select(Match.id, Match.best_of, Match.team1_odds, Match.team2_odds,
+                    team1.name, team1.power_rank, team2.name, team2.power_rank)
+             .join(team1, Match.team1_id == team1.id)
+             .join(team2, Match.team2_id == team2.id)
+             .where(Match.result.is_(None), or_(Match.kickoff > datetime.now(), Match.team1_odds == 0)))
+    if not bets_manager.lock_odds:
+        query = query.where(~exists().where(Bet.match_id == Match.id, Bet.settled_at.is_(None)))
+    rows = session.execute(query).all()
+    if not rows:
+        return 0
+
+    ids, best_of, old1, old2, name1, rank1, name2, rank2 = zip(*rows)
+    odds1, odds2 = matches_manager.generate_odds_batch(rank1, rank2, best_of)
+
+    # TBD or unranked sides get no odds
+    unpriced = (np.array(name1) == 'TBD') | (np.array(name2) == 'TBD') | np.isnan(odds1) | np.isnan(odds2)
+    old1 = np.array(old1, dtype=float)
+    old2 = np.array(old2, dtype=float)
+    new1 = np.where(unpriced, np.nan, odds1)
+    new2 = np.where(unpriced, np.nan, odds2)
+    changed = ~(np.isclose(old1, new1, equal_nan=True) & np.isclose(old2, new2, equal_nan=True))
+
+    changes = [{'match_id': ids[i], 'odds1': None if unpriced[i] else float(new1[i]),
+                'odds2': None if unpriced[i] else float(new2[i])} for i in np.flatnonzero(changed)]
+    if changes:
+        # one executemany'd UPDATE in one transaction
+        session.execute(update(Match.__table__)
+                        .where(Match.__table__.c.id == bindparam('match_id'))
+                        .values(team1_odds=bindparam('odds1'), team2_odds=bindparam('odds2')), changes)
+        session.commit()
+        schedule_cache.bump()
+    logger.info('repriced %d of %d matches', len(changes), len(rows))
+    return len(changes)
+
+
+@app.route('/settle', methods=['POST'])
+@operator_required
+def settle_results():
+    """
+    POST match_id and result (either team's name, or VOID to refund) to record a result and pay out its bets;
+    without them, pay out the results already stored. Like every POST it needs the session's CSRF token
+    """
+    results = {}
+    match_id, result = request.form.get('match_id', type=int), request.form.get('result')
+    if match_id is not None or result:
+        match = session.get(Match, match_id) if match_id is not None else None
+        if match is None:
+            abort(404 if match_id is not None else 400)
+        sides = session.scalars(select(Team.name).where(Team.id.in_((match.team1_id, match.team2_id)))).all()
+        if result not in [name for name in sides if name != 'TBD'] + [void_result]:
+            abort(400)
+        if match.result is not None:
+            abort(409)  # already settled; recording it again would count it twice in the power ranks
+        results[match.id] = result
+    if live_odds and results:
+        # parimutuel bets pay at the final pool odds
+        pool_manager.freeze_odds(results)
+    summary = settlement_manager.settle(results)
+    user_cache.clear()  # balances were credited
+    logger.info('settled %d bets, %s tokens paid to %d users', summary['bets'], summary['paid'], summary['users'])
+    if results:
+        # fold the new results into the power ranks and reprice what's affected; open bets keep their odds
+        rating_manager.update(results)
+        reprice_matches()
     return redirect('/')
 
 
+@app.route('/pools')
+@login_required
+def check_pools():
+    """compare the running stake totals with the bets table (?rebuild=1 recomputes them from the bets first)"""
+    rebuilt = pool_manager.rebuild() if request.args.get('rebuild') else None
+    drift = pool_manager.check()
+    return jsonify(rebuilt=rebuilt, consistent=not drift,
+                   drift=[dict(match_id=row[0], team=row[1], bets_stake=row[2], pool_stake=row[3]) for row in drift])
+
+
+def crawl_job(full=False):
+    """
+    crawl every league's future matches, add or update their teams, upsert the matches whose content changed
+    since the last crawl and reprice them, timing each phase; full=True forgets the last-seen hashes and
+    upserts everything
+    """
+    phases = {}
+    start = time.perf_counter()
+    schedule = matches_manager.crawl()
+    short_list = matches_manager.start_crawl(schedule)
+    phases['crawl'] = time.perf_counter() - start
+    start = time.perf_counter()
+    # from the same page, so a match is never skipped for a team only the next teams job would have added
+    teams = upsert_teams(matches_manager.generate_ranking(schedule))
+    phases['teams'] = time.perf_counter() - start
+    start = time.perf_counter()
+    if full:
+        fingerprint_manager.clear('match')
+    hashes = {match_key(scheduled): match_fingerprint(scheduled) for scheduled in short_list}
+    changed = fingerprint_manager.changed('match', hashes)
+    phases['diff'] = time.perf_counter() - start
+    start = time.perf_counter()
+    delta = {(scheduled.league, scheduled.kickoff): match_key(scheduled) for scheduled in short_list
+             if match_key(scheduled) in changed}
+    upserted = upsert_matches([scheduled for scheduled in short_list if match_key(scheduled) in changed])
+    # only what was written is recorded: a match skipped for an unknown team is retried next crawl
+    fingerprint_manager.record('match', {delta[key]: changed[delta[key]] for key in upserted})
+    phases['persist'] = time.perf_counter() - start
+    start = time.perf_counter()
+    repriced = reprice_matches() if upserted else 0
+    phases['reprice'] = time.perf_counter() - start
+
+    for league_phases in matches_manager.timings.values():
+        metrics_manager.observe_phases(league_phases)  # fetch and parse, per league
+    metrics_manager.observe_phases({phase: phases[phase] for phase in ('teams', 'diff', 'persist', 'reprice')})
+    return {'crawled': len(short_list), 'teams': teams, 'changed': len(changed), 'upserted': len(upserted),
+            'repriced': repriced, 'phases': phases, 'leagues': matches_manager.timings,
+            'failed': {league: repr(error) for league, error in matches_manager.failures.items()}}
+
+
+def upsert_teams(teams):
+    """input: crawled Team objects, add the new ones and update those whose tricode or logo changed"""
+    crawled = {team.name: team for team in teams}
+    changed = fingerprint_manager.changed('team', {name: team_fingerprint(team) for name, team in crawled.items()})
+    if not changed:
+        return {'added': [], 'updated': []}
+
+    stored = {}
+    for team in session.query(Team).filter(Team.name.in_(list(changed))):
+        stored.setdefault(team.name, []).append(team)
+    added, updated = [], []
+    for name in changed:
+        if name not in stored:
+            added.append(name)
+            session.add(crawled[name])
+        for team in stored.get(name, []):
+            if (team.tricode, team.img_url) != (crawled[name].tricode, crawled[name].img_url):
+                team.tricode, team.img_url = crawled[name].tricode, crawled[name].img_url
+                updated.append(name)
+    session.commit()
+    fingerprint_manager.record('team', changed)
+    if added or updated:
+        schedule_cache.bump()
+    return {'added': added, 'updated': updated}
+
+
+def teams_job():
+    """crawl lolesports for the list of teams and add or update them"""
+    return upsert_teams(matches_manager.generate_ranking(matches_manager.crawl()))
+
+
+def rank_job():
+    """fit every team's power rank from the stored results and reprice the upcoming matches"""
+    return {'rated': len(rating_manager.fit()), 'repriced': reprice_matches()}
+
+
+def reprice_job():
+    return {'repriced': reprice_matches()}
+
+
+def full_crawl_job():
+    return crawl_job(full=True)
+
+
+jobs_manager = JobsManager(engine, {'crawl': crawl_job, 'full-crawl': full_crawl_job, 'teams': teams_job,
+                                    'rank': rank_job, 'reprice': reprice_job}, cleanup=session.remove,
+                          exclusive=('crawl', 'full-crawl', 'teams'))  # the jobs that start browsers
+
+
+@app.before_request
+def start_jobs():
+    if run_jobs:
+        jobs_manager.start()
+
+
+def queued(job_id):
+    return redirect(url_for('job_status', job_id=job_id))
+
+
+@app.route('/metrics')
+def metrics():
+    """request, SQL and crawler metrics of every process in the Prometheus text format (METRICS=1, METRICS_DIR)"""
+    if not metrics_manager.enabled:
+        abort(404)
+    return app.response_class(metrics_manager.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/jobs')
+@login_required
+def list_jobs():
+    """the most recent jobs with their status, duration and details"""
+    return jsonify(jobs=jobs_manager.recent(request.args.get('limit', 50, type=int)))
+
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = jobs_manager.job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
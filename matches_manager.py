@@ -1,129 +1,507 @@
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from html.parser import HTMLParser
+from importlib.util import find_spec
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import text
 
 from classes import Team
+from pricing import game_win_probability, series_win_probability
 
 
-lol_esports_url = 'https://lolesports.com/schedule?leagues=msi'
+lol_esports_url = 'https://lolesports.com/schedule?leagues={league}'
+leagues = [league.strip() for league in os.environ.get('LEAGUES', 'msi').split(',') if league.strip()]
 tbd_url = 'https://am-a.akamaihd.net/image?resize=140:&f=http%3A%2F%2Fassets.lolesports.com%2Fwatch%2Fteam-tbd.png'
 floor = 20
-overround = 0.05
-# number_of_days = 19
-remaining_no_days = 13
+overround = float(os.environ.get('ODDS_OVERROUND', 0.05))
+odds_mode = os.environ.get('ODDS_MODE', 'series')  # 'series': price the best_of series, 'game': a single game
 number_of_matches = 25
+season_year = int(os.environ['SEASON_YEAR']) if os.environ.get('SEASON_YEAR') else None  # unset: from the crawl date
+kickoff_format = '%B %d - %I %p'
+snapshot_dir = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+snapshot_keep = int(os.environ.get('SNAPSHOT_KEEP', 48))  # newest snapshots kept per league, 0: keep them all
+page_load_timeout = 30
+crawl_workers = int(os.environ.get('CRAWL_WORKERS', 4))  # leagues crawled at once
+# crawl jobs never overlap, not even across processes (see JobsManager's exclusive kinds), so this caps them all
+max_browsers = int(os.environ.get('MAX_BROWSERS', 4))  # headless chromes at once, shared by the crawl threads
+league_interval = float(os.environ.get('LEAGUE_INTERVAL', 30))  # min seconds between two loads of a league's page
+
+# a load is reserved in one statement: the returned start is at least the interval after the last reserved one,
+# and the slot after it is taken at once, so crawls in other threads or processes queue up behind it
+reserve_fetch_sql = text('INSERT INTO league_fetches (league, next_fetch) VALUES (:league, :now + :interval) '
+                         'ON CONFLICT (league) DO UPDATE SET next_fetch = MAX(next_fetch, :now) + :interval '
+                         'RETURNING next_fetch - :interval')
+# a load that ran long pushes the next one back to the interval after it ended
+finish_fetch_sql = text('UPDATE league_fetches SET next_fetch = MAX(next_fetch, :now + :interval) '
+                        'WHERE league = :league')
+
+# lxml is only imported once a page is parsed; web processes that never crawl don't load it
+html_parser = 'lxml' if find_spec('lxml') else 'html.parser'
+
+
+def parse_kickoff(date_time, year=season_year, now=None):
+    """
+    input: crawled 'May 5 - 8 PM' string, output: naive kickoff datetime. The page shows no year: without one
+    given, it is the year that puts the kickoff nearest the crawl (now), so a December crawl listing January
+    matches rolls over into the next year.
+    """
+    if year is not None:
+        return datetime.strptime(f'{year} {date_time}', f'%Y {kickoff_format}')
+    now = now or datetime.now()
+    candidates = []
+    for candidate_year in (now.year - 1, now.year, now.year + 1):
+        try:
+            candidates.append(datetime.strptime(f'{candidate_year} {date_time}', f'%Y {kickoff_format}'))
+        except ValueError:  # February 29 outside a leap year
+            pass
+    if not candidates:
+        raise ValueError(f'not a kickoff: {date_time!r}')
+    return min(candidates, key=lambda kickoff: abs(kickoff - now))
+
+
+class ScheduledMatch(NamedTuple):
+    datetime: str
+    best_of: int
+    team1: str
+    team2: str
+    tricode1: str
+    tricode2: str
+    logo1: str
+    logo2: str
+    league: str = ''
+
+    @property
+    def kickoff(self):
+        """the datetime string with its year inferred from today, what a match is keyed on within its league"""
+        return parse_kickoff(self.datetime)
+
+
+class ScheduleParser:
+    """
+    Single-pass schedule parser. It receives start/end/data events straight from the html tokenizer (lxml's
+    parser-target interface, or the stdlib html.parser through HTMLParserFeed) and never builds a document
+    tree: each .EventMatch is filled in as it streams past and takes the date of the last .EventDate above it.
+    """
+    void_tags = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track',
+                 'wbr'}
+
+    def __init__(self, league=''):
+        self.league = league
+        self.stack = []
+        self.open = Counter()  # open-element count per class, for O(1) "is inside" checks
+        self.schedule = []
+        self.day = None
+        self.date_spans = []
+        self.match = None
+        self.field = None
+        self.text = []
+        self.field_depth = 0
+
+    def start(self, tag, attrib):
+        classes = (attrib.get('class') or '').split()
+        if tag not in self.void_tags:
+            self.stack.append((tag, classes))
+            for name in classes:
+                self.open[name] += 1
+
+        if 'EventDate' in classes:
+            self.date_spans = []
+        elif 'EventMatch' in classes:
+            self.match = {'future': False, 'time': [], 'team1': [], 'team2': [], 'logo1': tbd_url,
+                          'logo2': tbd_url, 'league': []}
+
+        if self.field:
+            return
+        if self.match is not None and self.open['EventMatch']:
+            if 'future' in classes:
+                self.match['future'] = True
+            if tag == 'span' and self.open['time']:
+                self.capture('time')
+            elif tag == 'span' and self.open['team-info']:
+                self.capture('team1' if self.open['team1'] else 'team2')
+            elif tag == 'img' and (self.open['team1'] or self.open['team2']):
+                self.match['logo1' if self.open['team1'] else 'logo2'] = attrib.get('src') or tbd_url
+            elif tag == 'div' and self.open['league'] and 'league' not in classes:
+                self.capture('league')
+        elif tag == 'span' and self.open['EventDate'] and self.open['date']:
+            self.capture('date')
+
+    def capture(self, field):
+        self.field = field
+        self.text = []
+        self.field_depth = len(self.stack)
+
+    def data(self, data):
+        if self.field:
+            self.text.append(data)
+
+    def end(self, tag):
+        if tag in self.void_tags or not self.stack:
+            return
+        # well-formed pages close the innermost element; otherwise implicitly close up to the matching one
+        if self.stack[-1][0] != tag and all(open_tag != tag for open_tag, _ in self.stack):
+            return
+        while self.stack:
+            open_tag, classes = self.stack.pop()
+            for name in classes:
+                self.open[name] -= 1
+            if self.field and len(self.stack) < self.field_depth:
+                value = ''.join(self.text).strip()
+                (self.date_spans if self.field == 'date' else self.match[self.field]).append(value)
+                self.field = None
+            if 'EventDate' in classes and self.date_spans:
+                self.day = self.date_spans[-1]
+            elif 'EventMatch' in classes:
+                self.finish_match()
+            if open_tag == tag:
+                break
+
+    def finish_match(self):
+        match, self.match = self.match, None
+        if not (match['future'] and match['team1'] and match['team2'] and match['league']):
+            return
+        time = ' '.join(token for token in match['time'] if token != 'APPROX')
+        self.schedule.append(ScheduledMatch(datetime=f'{self.day} - {time}', best_of=int(match['league'][-1][-1]),
+                                            team1=match['team1'][0], team2=match['team2'][0],
+                                            tricode1=match['team1'][-1], tricode2=match['team2'][-1],
+                                            logo1=match['logo1'], logo2=match['logo2'], league=self.league))
+
+    def close(self):
+        return self.schedule
+
+
+class HTMLParserFeed(HTMLParser):
+    """adapts the stdlib tokenizer to the ScheduleParser target interface when lxml isn't installed"""
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def start_browser():
+    """one headless chrome with the page load timeout set"""
+    # selenium is only needed for live crawls, replaying snapshots works without it
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+class BrowserPool:
+    """
+    at most `size` browsers, started on demand and lent to one crawl thread at a time, reused across crawls;
+    a browser whose crawl raised (a timeout, a crashed tab) is quit instead of lent out again
+    """
+
+    def __init__(self, size=max_browsers, factory=start_browser):
+        self.size = size
+        self.factory = factory
+        self.slots = threading.BoundedSemaphore(size)  # one per browser lent out
+        self.idle = queue.LifoQueue()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def browser(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        except BaseException:
+            self.discard(driver)
+            raise
+        self.idle.put(driver)
+        self.slots.release()
+
+    def acquire(self):
+        # a browser is only started when none is idle, so started ones never outnumber the slots
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = self.factory()
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+    def discard(self, driver):
+        with self.lock:
+            self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass  # it is being dropped for misbehaving already
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            driver.quit()
+        self.idle = queue.LifoQueue()
 
 
 class MatchesManager:
-    def __init__(self):
+    """
+    Crawls the schedule of each league in `leagues` on a bounded thread pool: every league's page is loaded
+    in a browser borrowed from a capped BrowserPool, no more often than once per `interval` seconds, then
+    parsed into ScheduledMatch rows tagged with the league. With a bind, the interval is kept in the
+    league_fetches table and holds across processes; without one, within this process.
+    """
+
+    def __init__(self, leagues=leagues, snapshot_dir=snapshot_dir, workers=crawl_workers, browsers=max_browsers,
+                 interval=league_interval, keep=snapshot_keep, bind=None):
         self.initial_list = []
         self.match_list = []
         self.rating_list = []
+        self.leagues = list(leagues)
+        self.snapshot_dir = snapshot_dir
+        self.keep = keep
+        self.workers = workers
+        self.browsers = BrowserPool(browsers)
+        self.interval = interval
+        self.bind = bind
+        self.fetch_lock = threading.Lock()
+        self.next_fetch = {}  # {league: unix time}, when there's no bind
+        self.failures = {}
+        self.timings = {}  # {league: {'fetch': seconds, 'parse': seconds}} of the last crawl
+        self.schedule = None
+
+    def close(self):
+        self.browsers.close()
+
+    @contextmanager
+    def rate_limit(self, league):
+        """
+        a load of a league's page at least `interval` seconds after the start and the end of the previous one;
+        the slot is reserved first and waited for with no lock held
+        """
+        if self.interval <= 0:
+            yield
+            return
+        wait = self.reserve_fetch(league) - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            yield
+        finally:
+            self.finish_fetch(league)
+
+    def reserve_fetch(self, league):
+        """output: the unix time this load of league may start, with the slot after it already taken"""
+        params = {'league': league, 'now': time.time(), 'interval': self.interval}
+        if self.bind is not None:
+            with self.bind.begin() as connection:
+                return connection.execute(reserve_fetch_sql, params).scalar()
+        with self.fetch_lock:
+            start = max(self.next_fetch.get(league, params['now']), params['now'])
+            self.next_fetch[league] = start + self.interval
+        return start
+
+    def finish_fetch(self, league):
+        params = {'league': league, 'now': time.time(), 'interval': self.interval}
+        if self.bind is not None:
+            with self.bind.begin() as connection:
+                connection.execute(finish_fetch_sql, params)
+            return
+        with self.fetch_lock:
+            self.next_fetch[league] = max(self.next_fetch[league], params['now'] + self.interval)
+
+    def fetch_schedule(self, league):
+        """load a league's schedule page in a pooled browser, save the rendered html as a snapshot, output: html"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        with self.rate_limit(league), self.browsers.browser() as driver:
+            driver.get(lol_esports_url.format(league=league))
+            # the schedule is rendered client-side, wait for it instead of parsing a half-built page
+            WebDriverWait(driver, page_load_timeout).until(
+                expected_conditions.presence_of_element_located((By.CSS_SELECTOR, '.EventMatch')))
+            website = driver.page_source
+        self.save_snapshot(website, league)
+        return website
+
+    def save_snapshot(self, website, league=''):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f'schedule-{league}-{stamp}.html' if league else f'schedule-{stamp}.html'
+        path = os.path.join(self.snapshot_dir, name)
+        with open(path, 'w', encoding='utf-8') as snapshot:
+            snapshot.write(website)
+        self.prune_snapshots(league)
+        return path
+
+    def snapshots(self, league=None):
+        """output: names of the saved snapshots, oldest first; of one league if given ('' for untagged ones)"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        prefix = f'schedule-{league}-' if league else 'schedule-'
+        # the stamp and extension are the last 20 characters; 'lck' must not pick up 'lck-cl' snapshots
+        return sorted((name for name in os.listdir(self.snapshot_dir)
+                       if name.startswith(prefix) and name.endswith('.html')
+                       and (league is None or len(name) == len(prefix) + 20)), key=lambda name: name[-20:])
+
+    def latest_snapshot(self, league=None):
+        """output: path of the most recent saved snapshot (of one league, if given), or None"""
+        snapshots = self.snapshots(league)
+        return os.path.join(self.snapshot_dir, snapshots[-1]) if snapshots else None
+
+    def prune_snapshots(self, league=''):
+        """delete all but the newest `keep` snapshots of a league"""
+        if self.keep <= 0:
+            return
+        for name in self.snapshots(league)[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.snapshot_dir, name))
+            except FileNotFoundError:  # pruned by another process's crawl
+                pass
+
+    def crawl_league(self, league):
+        start = time.perf_counter()
+        website = self.fetch_schedule(league)
+        fetched = time.perf_counter()
+        schedule = self.parse_schedule(website, league)
+        self.timings[league] = {'fetch': fetched - start, 'parse': time.perf_counter() - fetched}
+        return schedule
+
+    def crawl(self, leagues=None):
+        """
+        fetch and parse every league's schedule concurrently; generate_ranking and start_crawl both read this
+        schedule. A league that fails is left out (see self.failures), unless they all fail.
+        """
+        leagues = list(leagues or self.leagues)
+        self.timings = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(leagues))),
+                                thread_name_prefix='crawl') as pool:
+            futures = {league: pool.submit(self.crawl_league, league) for league in leagues}
+        schedule, self.failures = [], {}
+        for league, future in futures.items():
+            try:
+                schedule.extend(future.result())
+            except Exception as error:
+                self.failures[league] = error
+        if self.failures and len(self.failures) == len(leagues):
+            raise next(iter(self.failures.values()))
+        self.schedule = schedule
+        return self.schedule
+
+    def replay(self, path=None, league=''):
+        """
+        parse a saved snapshot (tagged with league) instead of crawling, no browser involved; without a path,
+        the latest snapshot of every league
+        """
+        if path:
+            with open(path, encoding='utf-8') as snapshot:
+                self.schedule = self.parse_schedule(snapshot.read(), league)
+            return self.schedule
+        self.schedule = []
+        for league in self.leagues:
+            path = self.latest_snapshot(league)
+            if path:
+                with open(path, encoding='utf-8') as snapshot:
+                    self.schedule.extend(self.parse_schedule(snapshot.read(), league))
+        return self.schedule
+
+    def run(self):
+        """one crawl, output: (team list, match list) from the same page"""
+        schedule = self.crawl()
+        return self.generate_ranking(schedule), self.start_crawl(schedule)
+
+    def current_schedule(self, schedule=None):
+        """the given schedule, else the last crawled one, else a fresh crawl; an empty schedule is still one"""
+        if schedule is not None:
+            return schedule
+        if self.schedule is not None:
+            return self.schedule
+        return self.crawl()
+
+    def parse_schedule(self, website, league=''):
+        """input: schedule page html (and its league), output: list of ScheduledMatch for every upcoming match"""
+        target = ScheduleParser(league)
+        if html_parser == 'lxml':
+            from lxml import etree
+            return etree.fromstring(website, etree.HTMLParser(target=target))
+        feed = HTMLParserFeed(target)
+        feed.feed(website)
+        feed.close()
+        return target.close()
+
+    def generate_ranking(self, schedule=None):
+        """input: parsed schedule (crawled if not given), output: unique team list, TBD last"""
+        schedule = self.current_schedule(schedule)
+        self.rating_list = []
 
-    def generate_ranking(self):
-        """input: match_objects list, output: unique team list in json with power ranking"""
-        options = webdriver.ChromeOptions()
-        options.add_experimental_option('detach', True)
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        driver.get(lol_esports_url)
-
-        website = driver.page_source
-        soup = BeautifulSoup(website, 'html.parser')
-
-        # team 1 processing
-        all_team1 = soup.select(selector=".EventMatch .future .teams .team1 .team-info span")
-        team1_list = [team1.getText() for team1 in all_team1]
-        all_team1_img = soup.select(selector=".EventMatch .future .teams .team1 img")
-        team1_img = [team1.get('src') for team1 in all_team1_img]
-        team1_names = [name for name in team1_list if team1_list.index(name) % 2 == 0 and 'TBD' not in name]
-        team1_tri = [tri for tri in team1_list if team1_list.index(tri) % 2 == 1 and 'TBD' not in tri]
-        team1_img = [img for img in team1_img if 'team-tbd.png' not in img]
-
-        # team 2 processing
-        all_team2 = soup.select(selector=".EventMatch .future .teams .team2 .team-info span")
-        team2_list = [team2.getText() for team2 in all_team2]
-        all_team2_img = soup.select(selector=".EventMatch .future .teams .team2 img")
-        team2_img = [team2.get('src') for team2 in all_team2_img]
-        team2_names = [name for name in team2_list if team2_list.index(name) % 2 == 0 and 'TBD' not in name]
-        # team2_tri = [tri for tri in team2_list if team2_list.index(tri) % 2 == 1 and 'TBD' not in tri]
-        team2_img = [img for img in team2_img if 'team-tbd.png' not in img]
-
-        team2_tri = []
-        for tri in team2_list:
-            if 'TBD' not in tri:
-                if team2_list.index(tri) % 2 == 1:
-                    team2_tri.append(tri)
-                elif tri == 'T1' and team2_list.index(tri) % 2 == 0:  # exception: since T1 name == T1 tri
-                    team2_tri.append(tri)
-
-        # cross-checking and fusing
-        team_names = team1_names + team2_names
-        team_names = list(dict.fromkeys(team_names))
-
-        team_tri = team1_tri + team2_tri
-        team_tri = list(dict.fromkeys(team_tri))
-
-        team_img = team1_img + team2_img
-        team_img = list(dict.fromkeys(team_img))
-
-        # generating Team objects
-        for i in range(0, len(team_names)):
-            new_team = Team(name=team_names[i], tricode=team_tri[i], img_url=team_img[i], power_rank=None)
-            self.rating_list.append(new_team)
-        new_team = Team(name='TBD', tricode='TBD', img_url=tbd_url, power_rank=None)
-        self.rating_list.append(new_team)
+        teams = {}
+        for match in schedule:
+            for name, tricode, logo in ((match.team1, match.tricode1, match.logo1),
+                                        (match.team2, match.tricode2, match.logo2)):
+                if name != 'TBD' and name not in teams:
+                    teams[name] = Team(name=name, tricode=tricode, img_url=logo, power_rank=None)
+        self.rating_list = list(teams.values())
+        self.rating_list.append(Team(name='TBD', tricode='TBD', img_url=tbd_url, power_rank=None))
         return self.rating_list
 
-    def start_crawl(self):
-        """access lolesports page, generate list of match dictionaries"""
-        options = webdriver.ChromeOptions()
-        options.add_experimental_option('detach', True)
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        driver.get(lol_esports_url)
-
-        website = driver.page_source
-        soup = BeautifulSoup(website, 'html.parser')
-
-        all_time = soup.select(selector=".EventMatch .future .EventTime .time span")
-        time_list = [time.getText() for time in all_time if time.getText() != 'APPROX']
-
-        all_team1 = soup.select(selector=".EventMatch .future .teams .team1 .team-info span")
-        team1_list = [team1.getText() for team1 in all_team1]
-
-        all_team2 = soup.select(selector=".EventMatch .future .teams .team2 .team-info span")
-        team2_list = [team2.getText() for team2 in all_team2]
-
-        all_best_of = soup.select(selector=".EventMatch .future .league div")
-        best_of_list = [bo.getText() for bo in all_best_of]
-        best_of_list = [item[-1] for item in best_of_list]
-
-        all_days = soup.select(selector=".EventDate .date span")
-        all_days = [day.getText() for day in all_days[2::3]]
-        day_list = []
-        for i in range(0, int(remaining_no_days)):
-            a = all_days.pop(-1)
-            day_list.append(a)
-            day_list.append(a)
-            if 14 <= i <= 19 or i == 7:  # manually configured to match day order
-                day_list.append(a)
-                day_list.append(a)
-        day_list.reverse()
-
-        for item in range(0, len(team1_list), 2):
-            new_match = (f'{day_list[item]} - {time_list[item]} {time_list[item + 1]}', best_of_list[item + 1],
-                         team1_list[item], team2_list[item])
-            self.match_list.append(new_match)
+    def start_crawl(self, schedule=None):
+        """input: parsed schedule (crawled if not given), output: list of ScheduledMatch"""
+        self.match_list = list(self.current_schedule(schedule))
         return self.match_list
 
-    def generate_odds(self, pr1, pr2):
-        """generate processed match data to sql database"""
+    def generate_odds(self, pr1, pr2, best_of=None):
+        """input: power ranks of one pair (and the series length), output: (odds1, odds2)"""
+        odds1, odds2 = self.generate_odds_batch([pr1], [pr2], None if best_of is None else [best_of])
+        return float(odds1[0]), float(odds2[0])
+
+    def generate_odds_batch(self, pr1, pr2, best_of=None, margin=overround, mode=odds_mode):
+        """
+        input: equal-length sequences of team 1 / team 2 power ranks (None for unranked) and optionally their
+        best_of, output: (odds1, odds2) float arrays rounded to 2 places, NaN where a rank is missing.
+        In 'series' mode the per-game share becomes the chance of winning a best_of series before the margin
+        is added; without best_of, or in 'game' mode, the per-game share is priced directly.
+        margin is added to each side's probability before inverting, e.g. 0.05 -> 5% per side.
+        """
         # base chance
-        pr1 = 1 - (float(pr1) / int(floor))
-        pr2 = 1 - (float(pr2) / int(floor))
+        pr1 = 1 - np.asarray(pr1, dtype=float) / floor
+        pr2 = 1 - np.asarray(pr2, dtype=float) / floor
+
+        # predicted wager share (per game), stretched over the series length
+        share1 = game_win_probability(pr1, pr2)
+        if mode == 'series' and best_of is not None:
+            share1 = series_win_probability(share1, best_of)
 
-        # predicted wager share, add overround, inverse for odds
-        odds1 = round(1 / ((pr1 / (pr1 + pr2)) + int(overround)), 2)
-        odds2 = round(1 / ((pr2 / (pr1 + pr2)) + int(overround)), 2)
+        # add overround, inverse for odds
+        odds1 = np.round(1 / (share1 + margin), 2)
+        odds2 = np.round(1 / ((1 - share1) + margin), 2)
 
         return odds1, odds2
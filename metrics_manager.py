@@ -0,0 +1,253 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+from sqlalchemy import event
+
+
+metrics_enabled = os.environ.get('METRICS', '0') == '1'  # off: no hooks are installed and /metrics is a 404
+slow_query_ms = float(os.environ.get('SLOW_QUERY_MS', 100))  # statements slower than this are logged
+metrics_dir = os.environ.get('METRICS_DIR', 'metrics')  # where each process's metrics are merged from, '': no merge
+metrics_flush = float(os.environ.get('METRICS_FLUSH', 5))  # seconds between writes of a process's metrics file
+
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+statement_buckets = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+phase_buckets = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+slow_query_logger = logging.getLogger('octobet.sql')
+logger = logging.getLogger('octobet.metrics')
+
+
+def label_text(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Histogram:
+    """prometheus-style histogram: per label set, a count per bucket (cumulated when rendered), a sum and a count"""
+
+    def __init__(self, name, help_text, labels=(), buckets=latency_buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+
+    def add(self, series, label_values, value):
+        """sum another process's (counts, sum, count) for label_values into a snapshot"""
+        counts, total, count = value
+        if len(counts) != len(self.buckets) + 1:
+            return  # written with other buckets, by a process running an older version
+        own = series.get(label_values, ([0] * len(counts), 0.0, 0))
+        series[label_values] = ([a + b for a, b in zip(own[0], counts)], own[1] + total, own[2] + count)
+
+    def render(self, series):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = label_text(self.labels, label_values)
+            prefix = f'{labels},' if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def add(self, values, label_values, value):
+        values[label_values] = values.get(label_values, 0) + value
+
+    def render(self, values):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(values.items()):
+            labels = label_text(self.labels, label_values)
+            lines.append(f'{self.name}{{{labels}}} {value}' if labels else f'{self.name} {value}')
+        return lines
+
+
+class MetricsManager:
+    """
+    Request and crawler instrumentation, rendered in the Prometheus text format. instrument_app() times every
+    request by route; instrument_engine() counts and times the SQL statements each request runs (engine
+    events, kept per thread) and logs the slow ones. Nothing is hooked in while disabled.
+
+    Every gunicorn worker and worker.py keeps its own metrics, so with a directory set each process writes
+    them to its own file there every `flush` seconds (and at exit), and render() sums its own live metrics
+    with every other process's file: a scrape of any web worker sees the whole deployment, crawl phases from
+    worker.py included, at most `flush` seconds old. Files of exited processes stay in the sum, as counters
+    must never go down; gunicorn's master clears the directory when it starts.
+    """
+
+    def __init__(self, enabled=metrics_enabled, slow_query=slow_query_ms / 1000, directory=metrics_dir,
+                 flush=metrics_flush):
+        self.enabled = enabled
+        self.slow_query = slow_query
+        self.directory = directory
+        self.flush_interval = flush
+        self.flusher_pid = None
+        self.flusher_lock = threading.Lock()
+        self.process_file = None
+        self.current = threading.local()
+        self.request_latency = Histogram('octobet_request_duration_seconds', 'Request latency by route',
+                                         ('route', 'method', 'status'))
+        self.request_statements = Histogram('octobet_request_sql_statements', 'SQL statements per request',
+                                            ('route',), statement_buckets)
+        self.request_sql_time = Histogram('octobet_request_sql_seconds', 'Time spent in SQL per request',
+                                          ('route',))
+        self.statements = Counter('octobet_sql_statements_total', 'SQL statements executed, requests or not')
+        self.slow_statements = Counter('octobet_sql_slow_statements_total',
+                                       f'SQL statements slower than {slow_query_ms:g} ms')
+        self.crawl_phases = Histogram('octobet_crawl_phase_seconds', 'Crawler phase durations',
+                                      ('phase',), phase_buckets)
+        self.metrics = [self.request_latency, self.request_statements, self.request_sql_time, self.statements,
+                        self.slow_statements, self.crawl_phases]
+
+    def instrument_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def instrument_engine(self, engine):
+        if not self.enabled:
+            return
+        event.listen(engine, 'before_cursor_execute', self.before_statement)
+        event.listen(engine, 'after_cursor_execute', self.after_statement)
+
+    def start(self):
+        """start this process's flush thread, once per process (after gunicorn has forked the worker)"""
+        if not self.enabled or not self.directory or self.flusher_pid == os.getpid():
+            return
+        with self.flusher_lock:
+            if self.flusher_pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.process_file = f'{os.getpid()}-{time.time_ns()}.json'
+            self.flusher_pid = os.getpid()
+            threading.Thread(target=self.flush_loop, name='metrics-flush', daemon=True).start()
+            atexit.register(self.flush)
+
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('could not write %s', self.process_file)
+
+    def flush(self):
+        """write this process's metrics to its file, replacing it at once so a scrape never reads half of it"""
+        if self.flusher_pid != os.getpid():
+            return
+        data = {metric.name: [[list(label_values), value] for label_values, value in metric.snapshot().items()]
+                for metric in self.metrics}
+        path = os.path.join(self.directory, self.process_file)
+        with open(path + '.tmp', 'w') as metrics_file:
+            json.dump(data, metrics_file)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """output: {metric name: series}, this process's summed with the files of every other process"""
+        merged = {metric.name: metric.snapshot() for metric in self.metrics}
+        if not self.directory or not os.path.isdir(self.directory):
+            return merged
+        own = self.process_file if self.flusher_pid == os.getpid() else None
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as metrics_file:
+                    data = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue  # cleared, or from a process that died mid-write
+            for metric in self.metrics:
+                for label_values, value in data.get(metric.name, ()):
+                    metric.add(merged[metric.name], tuple(label_values), value)
+        return merged
+
+    def start_request(self):
+        self.start()
+        self.current.statements = 0
+        self.current.sql_time = 0.0
+        self.current.started = time.perf_counter()
+
+    def finish_request(self, response):
+        started = getattr(self.current, 'started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.request_latency.observe(time.perf_counter() - started, route, request.method, response.status_code)
+            self.request_statements.observe(self.current.statements, route)
+            self.request_sql_time.observe(self.current.sql_time, route)
+            self.current.started = None
+        return response
+
+    def before_statement(self, connection, cursor, statement, parameters, context, executemany):
+        context.statement_started = time.perf_counter()
+
+    def after_statement(self, connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.statement_started
+        self.statements.inc()
+        if getattr(self.current, 'started', None) is not None:
+            self.current.statements += 1
+            self.current.sql_time += elapsed
+        if elapsed >= self.slow_query:
+            self.slow_statements.inc()
+            slow_query_logger.warning('slow query (%.1f ms): %s', elapsed * 1000, ' '.join(statement.split()))
+
+    def observe_phases(self, phases):
+        """input: {phase: seconds} from a crawl"""
+        if self.enabled:
+            self.start()
+            for phase, seconds in phases.items():
+                self.crawl_phases.observe(seconds, phase)
+
+    def render(self):
+        merged = self.collect()
+        return '\n'.join(line for metric in self.metrics for line in metric.render(merged[metric.name])) + '\n'
+
+
+def clear_metrics(directory=metrics_dir):
+    """remove every process's metrics file, for a fresh start of the whole deployment"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,13 @@
+"""
+One-off schema setup: creates missing tables and upgrades an existing database to the current models. Run it
+once per deploy, before starting the web processes and the worker (the Procfile's release phase does this);
+the app itself no longer touches the schema when it is imported.
+
+    python migrate.py
+"""
+from database import engine
+from schema import create_schema
+
+
+if __name__ == '__main__':
+    create_schema(engine)
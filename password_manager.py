@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# hashing processes per web worker, 0: hash in the request; unset: the machine's cores split over the web workers
+hash_workers = int(os.environ['HASH_WORKERS']) if os.environ.get('HASH_WORKERS') else None
+hash_iterations = int(os.environ.get('HASH_ITERATIONS', 600000))  # pbkdf2 work factor for new and rehashed passwords
+hash_timeout = float(os.environ.get('HASH_TIMEOUT', 30))  # seconds a request waits for its hash
+salt_length = 8
+
+
+def default_hash_workers():
+    """the cores split evenly over the web workers (WEB_CONCURRENCY, which gunicorn.conf.py sets), at least one"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def verify_password(stored, password):
+    return check_password_hash(stored, password)
+
+
+class PasswordManager:
+    """
+    Password hashing off the request threads: hashes run in a small process pool (HASH_WORKERS processes per
+    web worker, by default the cores divided by the number of web workers), so a burst of logins costs about
+    the machine's cores in total and the worker's other threads keep serving pages while a login waits. The
+    pool is started on first use in each process, never in a gunicorn master that forks it. needs_rehash()
+    tells login which stored hashes use an older work factor.
+    """
+
+    def __init__(self, workers=hash_workers, iterations=hash_iterations, timeout=hash_timeout):
+        self.workers = workers
+        self.method = f'pbkdf2:sha256:{iterations}'
+        self.timeout = timeout
+        self.pool = None
+        self.pool_pid = None
+        self.lock = threading.Lock()
+
+    def executor(self):
+        if self.pool is None or self.pool_pid != os.getpid():
+            with self.lock:
+                if self.pool is None or self.pool_pid != os.getpid():
+                    # spawned, not forked: forking a process that runs threads can copy a held lock
+                    self.pool = ProcessPoolExecutor(self.pool_size(),
+                                                    mp_context=multiprocessing.get_context('spawn'))
+                    self.pool_pid = os.getpid()
+        return self.pool
+
+    def pool_size(self):
+        """resolved on first use, in the web worker, once gunicorn has published its worker count"""
+        return default_hash_workers() if self.workers is None else self.workers
+
+    def run(self, function, *args):
+        if self.pool_size() <= 0:
+            return function(*args)
+        return self.executor().submit(function, *args).result(self.timeout)
+
+    def hash(self, password):
+        """output: the stored form of password, at the current work factor"""
+        return self.run(hash_password, password, self.method)
+
+    def verify(self, stored, password):
+        return bool(stored) and self.run(verify_password, stored, password)
+
+    def needs_rehash(self, stored):
+        """true when a stored hash was made with another method or work factor than the current one"""
+        return stored.split('$', 1)[0] != self.method
+
+    def close(self):
+        if self.pool is not None and self.pool_pid == os.getpid():
+            self.pool.shutdown(cancel_futures=True)
+        self.pool = None
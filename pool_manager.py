@@ -0,0 +1,96 @@
+import os
+
+from sqlalchemy import bindparam, text
+
+from matches_manager import overround
+
+
+live_odds = os.environ.get('LIVE_ODDS', '0') == '1'  # show pool-driven odds instead of the power-rank odds
+pool_prior = float(os.environ.get('POOL_PRIOR', 100))  # pseudo-stake split by the model odds, steadies thin pools
+live_odds_ttl = float(os.environ.get('LIVE_ODDS_TTL', 2))  # seconds a page with live odds may be served from cache
+
+# O(1) per bet: bump this side's running total inside the bet's own transaction
+record_stake_sql = text('INSERT INTO match_pools (match_id, team, stake, bets) '
+                        'VALUES (:match_id, :user_team, :amount, 1) ON CONFLICT (match_id, team) DO UPDATE '
+                        'SET stake = match_pools.stake + excluded.stake, bets = match_pools.bets + 1')
+
+pools_sql = text('''
+SELECT matches.id, matches.team1_odds, COALESCE(pool1.stake, 0), COALESCE(pool2.stake, 0)
+FROM matches
+JOIN teams AS team1 ON team1.id = matches.team1_id
+JOIN teams AS team2 ON team2.id = matches.team2_id
+LEFT JOIN match_pools AS pool1 ON pool1.match_id = matches.id AND pool1.team = team1.name
+LEFT JOIN match_pools AS pool2 ON pool2.match_id = matches.id AND pool2.team = team2.name
+WHERE matches.id IN :match_ids
+''').bindparams(bindparam('match_ids', expanding=True))
+
+totals_from_bets_sql = ('SELECT match_id, user_team, SUM(amount) AS stake, COUNT(*) AS bets FROM bets '
+                        'WHERE match_id IS NOT NULL AND user_team IS NOT NULL GROUP BY match_id, user_team')
+
+rebuild_sql = text(f'INSERT INTO match_pools (match_id, team, stake, bets) {totals_from_bets_sql}')
+clear_sql = text('DELETE FROM match_pools')
+
+drift_sql = text(f'''
+SELECT totals.match_id, totals.user_team, totals.stake, match_pools.stake
+FROM ({totals_from_bets_sql}) AS totals
+LEFT JOIN match_pools ON match_pools.match_id = totals.match_id AND match_pools.team = totals.user_team
+WHERE match_pools.stake IS NOT totals.stake
+UNION ALL
+SELECT match_pools.match_id, match_pools.team, NULL, match_pools.stake FROM match_pools
+WHERE NOT EXISTS (SELECT 1 FROM bets WHERE bets.match_id = match_pools.match_id
+                  AND bets.user_team = match_pools.team)
+''')
+
+freeze_sql = text('UPDATE matches SET team1_odds = :odds1, team2_odds = :odds2 WHERE id = :match_id')
+
+
+class PoolManager:
+    """
+    Parimutuel odds from running per-match, per-side stake totals (match_pools). BetsManager adds each bet to
+    its side's total as it is written, so reading a match's odds is two primary-key lookups no matter how many
+    bets it has. The totals can be rebuilt from the bets table, or compared with it, at any time.
+    """
+
+    def __init__(self, bind, margin=overround, prior=pool_prior):
+        self.bind = bind
+        self.margin = margin
+        self.prior = prior
+
+    def model_share(self, odds):
+        """implied team 1 probability from stored (model) odds, or even money when the match isn't priced"""
+        if not odds:
+            return 0.5
+        return min(max(1 / odds - self.margin, 0.0), 1.0)
+
+    def pool_odds(self, match_ids):
+        """input: match ids, output: {match_id: (odds1, odds2)} from the pools, margin added to each side's share"""
+        match_ids = list(match_ids)
+        if not match_ids:
+            return {}
+        with self.bind.connect() as connection:
+            rows = connection.execute(pools_sql, {'match_ids': match_ids}).all()
+        odds = {}
+        for match_id, model1, stake1, stake2 in rows:
+            share1 = (stake1 + self.prior * self.model_share(model1)) / (stake1 + stake2 + self.prior)
+            odds[match_id] = (round(1 / (share1 + self.margin), 2), round(1 / (1 - share1 + self.margin), 2))
+        return odds
+
+    def rebuild(self):
+        """recompute every running total from the bets table, output: number of pool rows"""
+        with self.bind.begin() as connection:
+            connection.execute(clear_sql)
+            return connection.execute(rebuild_sql).rowcount
+
+    def check(self):
+        """output: [(match_id, team, stake in bets, stake in match_pools)] wherever the running totals drifted"""
+        with self.bind.connect() as connection:
+            return [tuple(row) for row in connection.execute(drift_sql)]
+
+    def freeze_odds(self, match_ids):
+        """write the current pool odds into matches.team1_odds/team2_odds, e.g. before settling at final odds"""
+        odds = self.pool_odds(match_ids)
+        if odds:
+            with self.bind.begin() as connection:
+                connection.execute(freeze_sql, [{'match_id': match_id, 'odds1': odds1, 'odds2': odds2}
+                                                for match_id, (odds1, odds2) in odds.items()])
+        return odds
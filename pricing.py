@@ -0,0 +1,65 @@
+from math import comb
+
+import numpy as np
+
+
+def series_win_probability(p, best_of):
+    """
+    input: per-game win probabilities and best-of lengths (arrays or scalars, broadcast together),
+    output: probability of winning the series. Closed form for first to k = (best_of + 1) // 2 wins:
+    sum over j < k of C(k - 1 + j, j) * p^k * (1 - p)^j, i.e. win the last game after j losses.
+    """
+    p = np.asarray(p, dtype=float)
+    best_of = np.asarray(best_of, dtype=int)
+    p, best_of = np.broadcast_arrays(p, best_of)
+    q = 1 - p
+    series = np.full(p.shape, np.nan)
+    for length in np.unique(best_of):
+        needed = (int(length) + 1) // 2
+        rows = best_of == length
+        series[rows] = sum(comb(needed - 1 + j, j) * p[rows] ** needed * q[rows] ** j for j in range(needed))
+    return series
+
+
+def simulate_series(p, best_of, iterations=100_000, seed=None):
+    """
+    input: per-game win probabilities and best-of lengths, output: Monte Carlo estimate of the series win
+    probability. Playing out all best_of games gives the same winner as stopping at k wins, so each
+    series is one binomial draw.
+    """
+    rng = np.random.default_rng(seed)
+    p = np.asarray(p, dtype=float)
+    best_of = np.asarray(best_of, dtype=int)
+    p, best_of = np.broadcast_arrays(p, best_of)
+    wins = rng.binomial(best_of, p, size=(iterations,) + p.shape)
+    return (wins >= (best_of + 1) // 2).mean(axis=0)
+
+
+def game_win_probability(strength1, strength2):
+    """per-game chance of side 1 from 0-1 strengths, the same share used by MatchesManager.generate_odds_batch"""
+    strength1 = np.asarray(strength1, dtype=float)
+    strength2 = np.asarray(strength2, dtype=float)
+    return strength1 / (strength1 + strength2)
+
+
+def simulate_bracket(strengths, best_of=3, iterations=100_000, seed=None):
+    """
+    input: strengths of the teams in bracket seeding order (a power of two; neighbours meet in round one),
+    best_of as one length or one per round, output: array of each team's probability of winning the bracket.
+    Every round of every iteration is simulated at once: survivors is an (iterations, teams left) array.
+    """
+    rng = np.random.default_rng(seed)
+    strengths = np.asarray(strengths, dtype=float)
+    teams = len(strengths)
+    rounds = int(np.log2(teams))
+    if 2 ** rounds != teams:
+        raise ValueError('bracket size must be a power of two')
+    lengths = [best_of] * rounds if np.isscalar(best_of) else list(best_of)
+
+    survivors = np.broadcast_to(np.arange(teams), (iterations, teams))
+    for length in lengths:
+        side1, side2 = survivors[:, ::2], survivors[:, 1::2]
+        p = game_win_probability(strengths[side1], strengths[side2])
+        side1_wins = rng.binomial(length, p) >= (length + 1) // 2
+        survivors = np.where(side1_wins, side1, side2)
+    return np.bincount(survivors[:, 0], minlength=teams) / iterations
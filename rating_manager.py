@@ -0,0 +1,195 @@
+import json
+import os
+from math import comb
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+from matches_manager import floor
+from pricing import series_win_probability
+
+
+rating_prior = float(os.environ.get('RATING_PRIOR', 1))  # virtual game win and loss against the team's seed
+rating_tolerance = 1e-9
+rating_max_iterations = 100
+
+# (winner id, loser id, best_of) of each match with a stored result; ids both NULL for any other result (e.g. VOID)
+results_sql = ('SELECT CASE matches.result WHEN team1.name THEN team1.id WHEN team2.name THEN team2.id END, '
+               'CASE matches.result WHEN team1.name THEN team2.id WHEN team2.name THEN team1.id END, '
+               'matches.best_of '
+               'FROM matches JOIN teams AS team1 ON team1.id = matches.team1_id '
+               'JOIN teams AS team2 ON team2.id = matches.team2_id '
+               'WHERE matches.result IS NOT NULL')
+all_results_sql = text(results_sql + ' AND matches.result IN (team1.name, team2.name)')
+new_results_sql = text(results_sql + ' AND matches.id IN :match_ids').bindparams(bindparam('match_ids',
+                                                                                          expanding=True))
+count_results_sql = text('SELECT COUNT(*) FROM matches WHERE result IS NOT NULL')
+seeds_sql = text(f'SELECT id, seed_rank FROM teams WHERE seed_rank >= 0 AND seed_rank < {floor} ORDER BY id')
+
+# every power rank in one statement, the (team id, rank) pairs passed as a single JSON array
+write_ranks_sql = text('UPDATE teams SET power_rank = json_extract(ranks.value, \'$[1]\') '
+                       'FROM json_each(:ranks) AS ranks WHERE teams.id = json_extract(ranks.value, \'$[0]\')')
+
+
+def series_terms(log_strengths, winners, losers, best_of):
+    """
+    per result: first and second derivative of log P(winner takes the best_of series) in the winner's log
+    strength, where each game is won with the per-game share p = s_w / (s_w + s_l). For first to k wins out
+    of n = 2k - 1 games, dP/dp = n * C(n - 1, k - 1) * p^(k - 1) * q^(k - 1), so with d = log s_w - log s_l
+    the first derivative is n * C(n - 1, k - 1) * (pq)^k / P and the second is first * (k (q - p) - first).
+    For k = 1 this is the single-game model: q and -pq.
+    """
+    p = 1 / (1 + np.exp(log_strengths[losers] - log_strengths[winners]))
+    q = 1 - p
+    needed = np.maximum(1, (np.asarray(best_of) + 1) // 2)
+    first = np.empty(len(p))
+    for k in np.unique(needed):
+        rows = needed == k
+        coefficient = (2 * k - 1) * comb(2 * k - 2, k - 1)
+        first[rows] = coefficient * (p[rows] * q[rows]) ** k / series_win_probability(p[rows], 2 * k - 1)
+    return first, first * (needed * (q - p) - first)
+
+
+def fit_bradley_terry(winners, losers, best_of, teams, strengths=None, centers=None, prior=rating_prior,
+                      tolerance=rating_tolerance, max_iterations=rating_max_iterations):
+    """
+    input: the winner's and loser's index (0 to teams - 1) and the best_of of every decided match, optionally
+    the previous strengths as a warm start and each team's prior center (log strength, default 0),
+    output: (per-game Bradley-Terry strengths, iterations). P(i beats j in a game) = s_i / (s_i + s_j) and a
+    result is scored as the series it was, so a best-of-5 win says more than a best-of-1 win. Fitted by
+    maximum likelihood with Newton steps on the log strengths, every team at once (a few iterations from
+    scratch, one or two from a warm start). prior adds that many game wins and losses against a virtual team
+    at the team's center, which keeps unbeaten and winless teams finite, pulls teams with few results toward
+    their seed and keeps the problem well conditioned.
+    """
+    winners = np.asarray(winners, dtype=int)
+    losers = np.asarray(losers, dtype=int)
+    centers = np.zeros(teams) if centers is None else np.asarray(centers, dtype=float)
+    log_strengths = centers.copy() if strengths is None else np.log(np.asarray(strengths, dtype=float))
+    if not teams:
+        return np.exp(log_strengths), 0
+    for iteration in range(1, max_iterations + 1):
+        first, second = series_terms(log_strengths, winners, losers, best_of)
+        virtual = 1 / (1 + np.exp(centers - log_strengths))  # P(i beats its virtual team)
+        gradient = prior * (1 - 2 * virtual)
+        np.add.at(gradient, winners, first)
+        np.add.at(gradient, losers, -first)
+        hessian = np.diag(-2 * prior * virtual * (1 - virtual))
+        np.add.at(hessian, (winners, winners), second)
+        np.add.at(hessian, (losers, losers), second)
+        np.add.at(hessian, (winners, losers), -second)
+        np.add.at(hessian, (losers, winners), -second)
+        step = np.linalg.solve(hessian, gradient)
+        log_strengths -= step
+        if np.max(np.abs(step)) < tolerance:
+            break
+    return np.exp(log_strengths), iteration
+
+
+def rank_strength(rank):
+    """power rank -> per-game strength, the scale generate_odds_batch reads (1 - rank / floor)"""
+    return 1 - np.asarray(rank, dtype=float) / floor
+
+
+def power_ranks(strengths):
+    """
+    per-game strengths -> power ranks on the scale generate_odds_batch reads, scaled down only when a team
+    is stronger than 1 (so seeded ranks stay where they were set); the per-game share s1 / (s1 + s2) it
+    prices is exactly the Bradley-Terry probability, which 'series' mode then plays out over best_of
+    """
+    strengths = np.asarray(strengths, dtype=float)
+    return floor * (1 - strengths / max(strengths.max(), 1))
+
+
+class RatingManager:
+    """
+    Per-game power ranks fitted from stored match results (Bradley-Terry scored by series, see
+    fit_bradley_terry), starting from the seed_rank an operator set for a team, if any. The results and
+    strengths stay in memory, so when one new result arrives update() adds it and re-converges from the
+    previous strengths instead of starting over. Only teams with a seed or at least one decided match are
+    rated; the rest keep whatever power_rank they had.
+    """
+
+    def __init__(self, bind, prior=rating_prior):
+        self.bind = bind
+        self.prior = prior
+        self.team_ids = []
+        self.index = {}
+        self.winners = np.zeros(0, dtype=int)
+        self.losers = np.zeros(0, dtype=int)
+        self.best_of = np.zeros(0, dtype=int)
+        self.centers = np.zeros(0)
+        self.strengths = np.zeros(0)
+        self.results = 0
+        self.seeds = []
+
+    def fit(self):
+        """full fit from every stored result and seed, output: {team_id: power_rank} (also written to teams)"""
+        with self.bind.connect() as connection:
+            self.results = connection.execute(count_results_sql).scalar()
+            rows = connection.execute(all_results_sql).all()
+            self.seeds = connection.execute(seeds_sql).all()
+        # flattened by hand: np.array() over Row objects is orders of magnitude slower
+        pairs = np.fromiter((team_id for row in rows for team_id in row[:2]), dtype=int, count=2 * len(rows))
+        seeded = np.fromiter((team_id for team_id, _ in self.seeds), dtype=int, count=len(self.seeds))
+        team_ids, sides = np.unique(np.concatenate([pairs, seeded]), return_inverse=True)
+        self.team_ids = team_ids.tolist()
+        self.index = {team_id: i for i, team_id in enumerate(self.team_ids)}
+        sides = sides[:len(pairs)].reshape(-1, 2)
+        self.winners, self.losers = sides[:, 0], sides[:, 1]
+        self.best_of = np.fromiter((row[2] for row in rows), dtype=int, count=len(rows))
+        self.centers = np.full(len(self.team_ids), self.default_center())
+        for team_id, rank in self.seeds:
+            self.centers[self.index[team_id]] = np.log(rank_strength(rank))
+        self.strengths, _ = fit_bradley_terry(self.winners, self.losers, self.best_of, len(self.team_ids),
+                                              centers=self.centers, prior=self.prior)
+        return self.write()
+
+    def update(self, match_ids):
+        """
+        input: ids of matches whose result was just recorded, output: {team_id: power_rank}. Falls back to a
+        full fit the first time, or when another process recorded results or changed seeds in between.
+        """
+        match_ids = list(match_ids)
+        with self.bind.connect() as connection:
+            stored = connection.execute(count_results_sql).scalar()
+            rows = connection.execute(new_results_sql, {'match_ids': match_ids}).all()
+            seeds = connection.execute(seeds_sql).all()
+        if not self.team_ids or stored != self.results + len(rows) or seeds != self.seeds:
+            return self.fit()
+
+        self.results = stored
+        for winner, loser, best_of in rows:
+            if winner is None:
+                continue
+            for team_id in (winner, loser):
+                if team_id not in self.index:
+                    self.add_team(team_id)
+            self.winners = np.append(self.winners, self.index[winner])
+            self.losers = np.append(self.losers, self.index[loser])
+            self.best_of = np.append(self.best_of, best_of)
+        self.strengths, _ = fit_bradley_terry(self.winners, self.losers, self.best_of, len(self.team_ids),
+                                              self.strengths, self.centers, prior=self.prior)
+        return self.write()
+
+    def default_center(self):
+        """prior center of an unseeded team: the average seed, or strength 1 when nothing is seeded"""
+        if not self.seeds:
+            return 0.0
+        return float(np.mean(np.log(rank_strength([rank for _, rank in self.seeds]))))
+
+    def add_team(self, team_id):
+        """grow the fit by one unseeded team, starting it at its prior center"""
+        self.index[team_id] = len(self.team_ids)
+        self.team_ids.append(team_id)
+        self.centers = np.append(self.centers, self.default_center())
+        self.strengths = np.append(self.strengths, np.exp(self.centers[-1]))
+
+    def write(self):
+        """write every fitted team's power_rank in one UPDATE, output: {team_id: power_rank}"""
+        if not self.team_ids:
+            return {}
+        ranks = dict(zip(self.team_ids, power_ranks(self.strengths).tolist()))
+        with self.bind.begin() as connection:
+            connection.execute(write_ranks_sql, {'ranks': json.dumps(list(ranks.items()))})
+        return ranks
@@ -0,0 +1,116 @@
+"""
+Schema setup, run once per deploy (python migrate.py) rather than on every import of the app: creates missing
+tables and brings an existing database up to the current models.
+"""
+import re
+
+from sqlalchemy import inspect, text, update
+from sqlalchemy.schema import CreateTable
+
+from classes import Base, Match
+from matches_manager import parse_kickoff
+
+
+# matches stored before kickoffs were stored were all crawled in the 2023 season
+legacy_season_year = 2023
+
+# Columns and indexes added after the first deploy, which create_all() won't add to existing tables;
+# a column can carry a one-off backfill that runs only when the column is added
+added_columns = [('matches', 'kickoff', 'DATETIME'),
+                 ('bets', 'user_id', 'INTEGER REFERENCES users (id)'),
+                 ('bets', 'match_id', 'INTEGER REFERENCES matches (id)'),
+                 ('matches', 'team1_id', 'INTEGER REFERENCES teams (id)'),
+                 ('matches', 'team2_id', 'INTEGER REFERENCES teams (id)'),
+                 ('bets', 'payout', 'FLOAT'),
+                 ('bets', 'settled_at', 'DATETIME'),
+                 ('matches', 'league', 'VARCHAR'),
+                 ('users', 'profit', 'FLOAT DEFAULT 0',
+                  'UPDATE users SET profit = (SELECT COALESCE(SUM(payout - amount), 0) FROM bets '
+                  'WHERE bets.user_id = users.id AND bets.settled_at IS NOT NULL)'),
+                 # the ranks entered by hand before they were fitted become the seeds
+                 ('teams', 'seed_rank', 'FLOAT', "UPDATE teams SET seed_rank = power_rank WHERE name != 'TBD'"),
+                 # older bets have no odds of their own and keep settling at the match's
+                 ('bets', 'odds', 'FLOAT')]
+backfills = ['UPDATE bets SET user_id = (SELECT user_id FROM user_bets WHERE bet_id = bets.id) '
+             'WHERE user_id IS NULL',
+             'UPDATE bets SET match_id = (SELECT match_id FROM match_bets WHERE bet_id = bets.id) '
+             'WHERE match_id IS NULL',
+             # match.teams lists the lower team id first, keep that as team1
+             'UPDATE matches SET team1_id = (SELECT MIN(team_id) FROM match_teams WHERE match_id = matches.id), '
+             'team2_id = (SELECT MAX(team_id) FROM match_teams WHERE match_id = matches.id) '
+             'WHERE team1_id IS NULL',
+             # every match crawled before leagues were configurable came from the msi schedule
+             "UPDATE matches SET league = 'msi' WHERE league IS NULL",
+             'INSERT INTO match_pools (match_id, team, stake, bets) '
+             'SELECT match_id, user_team, SUM(amount), COUNT(*) FROM bets '
+             'WHERE match_id IS NOT NULL AND user_team IS NOT NULL '
+             'AND NOT EXISTS (SELECT 1 FROM match_pools) GROUP BY match_id, user_team']
+added_indexes = ['CREATE INDEX IF NOT EXISTS ix_matches_kickoff ON matches (kickoff)',
+                 'CREATE UNIQUE INDEX IF NOT EXISTS uq_bets_user_match ON bets (user_id, match_id)',
+                 'CREATE INDEX IF NOT EXISTS ix_bets_open ON bets (match_id, user_id) WHERE settled_at IS NULL',
+                 'CREATE INDEX IF NOT EXISTS ix_bets_user_history ON bets (user_id, id)',
+                 'CREATE INDEX IF NOT EXISTS ix_users_token_balance ON users (token_balance, id)',
+                 'CREATE INDEX IF NOT EXISTS ix_users_profit ON users (profit, id)',
+                 # the crawled datetime string repeats every season, the kickoff doesn't
+                 'DROP INDEX IF EXISTS uq_matches_league_datetime',
+                 'CREATE UNIQUE INDEX IF NOT EXISTS uq_matches_league_kickoff ON matches (league, kickoff)']
+
+
+def rebuild_table(connection, table):
+    """
+    recreate a table from its model, keeping its rows and ids: SQLite can't drop a constraint in place. The
+    table's indexes go with the old copy and are recreated from added_indexes.
+    """
+    columns = ', '.join(column.name for column in table.columns)
+    ddl = str(CreateTable(table).compile(connection))
+    connection.execute(text(ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {table.name}_rebuild ', 1)))
+    connection.execute(text(f'INSERT INTO {table.name}_rebuild ({columns}) SELECT {columns} FROM {table.name}'))
+    connection.execute(text(f'DROP TABLE {table.name}'))
+    connection.execute(text(f'ALTER TABLE {table.name}_rebuild RENAME TO {table.name}'))
+
+
+def drop_unique(connection, table, column):
+    """
+    drop a single-column UNIQUE from a table by rebuilding it from its live DDL, so columns whose live
+    definition drifted from the model (e.g. a nullable legacy column) are kept as they are
+    """
+    ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"),
+                             {'table': table}).scalar()
+    ddl = re.sub(rf',\s*UNIQUE\s*\(\s*"?{column}"?\s*\)', '', ddl, count=1)
+    ddl = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {table}_rebuild', ddl, count=1)
+    connection.execute(text(ddl))
+    connection.execute(text(f'INSERT INTO {table}_rebuild SELECT * FROM {table}'))
+    connection.execute(text(f'DROP TABLE {table}'))
+    connection.execute(text(f'ALTER TABLE {table}_rebuild RENAME TO {table}'))
+
+
+def upgrade_schema(bind):
+    """bring an existing database up to the current models and backfill derived columns"""
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table, column, ddl_type, *backfill in added_columns:
+            if column not in {col['name'] for col in inspector.get_columns(table)}:
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+                for statement in backfill:
+                    connection.execute(text(statement))
+        # matches.datetime used to be unique on its own, now league and kickoff are
+        if any(unique['column_names'] == ['datetime'] for unique in inspector.get_unique_constraints('matches')):
+            rebuild_table(connection, Match.__table__)
+        # bets.datetime was unique, which two worker processes stamping bets in the same microsecond could break
+        if any(unique['column_names'] == ['datetime'] for unique in inspector.get_unique_constraints('bets')):
+            drop_unique(connection, 'bets', 'datetime')
+        for statement in backfills:
+            connection.execute(text(statement))
+        # before the indexes: the unique one is on the kickoff
+        for match_id, date_time in connection.execute(text('SELECT id, datetime FROM matches '
+                                                           'WHERE kickoff IS NULL')).all():
+            connection.execute(update(Match.__table__).where(Match.__table__.c.id == match_id)
+                               .values(kickoff=parse_kickoff(date_time, year=legacy_season_year)))
+        for ddl in added_indexes:
+            connection.execute(text(ddl))
+
+
+def create_schema(bind):
+    """create whatever tables are missing, then upgrade the existing ones"""
+    Base.metadata.create_all(bind)
+    upgrade_schema(bind)
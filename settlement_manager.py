@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, text, DateTime
+
+
+void_result = 'VOID'  # the result that refunds every bet on a match
+
+record_result_sql = text('UPDATE matches SET result = :result WHERE id = :match_id AND result IS NULL')
+
+pending_matches_sql = text('SELECT DISTINCT bets.match_id FROM bets JOIN matches ON matches.id = bets.match_id '
+                           'WHERE bets.settled_at IS NULL AND matches.result IS NOT NULL')
+
+# scratch table holding this run's payouts, private to the connection
+create_payouts_sql = text('CREATE TEMP TABLE IF NOT EXISTS settlement_payouts '
+                          '(bet_id INTEGER PRIMARY KEY, user_id INTEGER, stake FLOAT, payout FLOAT)')
+clear_payouts_sql = text('DELETE FROM settlement_payouts')
+
+# winning side pays amount * the odds the bet was placed at (the match's for bets without any), losing side 0,
+# any other result (e.g. VOID) refunds the amount
+payouts_sql = text('''
+INSERT INTO settlement_payouts (bet_id, user_id, stake, payout)
+SELECT bets.id, bets.user_id, bets.amount, CASE
+    WHEN matches.result = team1.name THEN
+        CASE WHEN bets.user_team = team1.name THEN bets.amount * COALESCE(bets.odds, matches.team1_odds, 1) ELSE 0 END
+    WHEN matches.result = team2.name THEN
+        CASE WHEN bets.user_team = team2.name THEN bets.amount * COALESCE(bets.odds, matches.team2_odds, 1) ELSE 0 END
+    ELSE bets.amount
+END
+FROM bets
+JOIN matches ON matches.id = bets.match_id
+JOIN teams AS team1 ON team1.id = matches.team1_id
+JOIN teams AS team2 ON team2.id = matches.team2_id
+WHERE bets.settled_at IS NULL AND bets.match_id IN :match_ids AND matches.result IS NOT NULL
+''').bindparams(bindparam('match_ids', expanding=True))
+
+mark_settled_sql = text('UPDATE bets SET payout = settlement_payouts.payout, settled_at = :settled_at '
+                        'FROM settlement_payouts WHERE bets.id = settlement_payouts.bet_id'
+                        ).bindparams(bindparam('settled_at', type_=DateTime))
+
+# profit (settled payouts minus settled stakes) moves with the balance, keeping the leaderboard indexes current
+credit_sql = text('UPDATE users SET token_balance = COALESCE(users.token_balance, 0) + totals.paid, '
+                  'profit = COALESCE(users.profit, 0) + totals.paid - totals.staked '
+                  'FROM (SELECT user_id, SUM(payout) AS paid, SUM(stake) AS staked FROM settlement_payouts '
+                  'GROUP BY user_id) AS totals '
+                  'WHERE users.id = totals.user_id')
+
+total_paid_sql = text('SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(payout), 0) FROM settlement_payouts')
+
+
+class SettlementManager:
+    """
+    Set-based settlement: records match results, computes every open bet's payout on those matches into a temp
+    table with one INSERT ... SELECT, then marks the bets and credits the users from it with one UPDATE each,
+    all in one transaction. A bet is only ever paid once: it is skipped as soon as settled_at is set.
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+
+    def settle(self, results=None):
+        """
+        input: {match_id: result} to record (result is the winning team's name, or VOID to refund), may be empty
+        to only settle matches whose result is already stored, output: {'bets', 'users', 'paid'} for this run
+        """
+        results = dict(results or {})
+        with self.bind.begin() as connection:
+            if results:
+                connection.execute(record_result_sql, [{'match_id': match_id, 'result': result}
+                                                       for match_id, result in results.items()])
+            match_ids = [row[0] for row in connection.execute(pending_matches_sql)]
+            if not match_ids:
+                return {'bets': 0, 'users': 0, 'paid': 0}
+
+            connection.execute(create_payouts_sql)
+            connection.execute(clear_payouts_sql)
+            connection.execute(payouts_sql, {'match_ids': match_ids})
+            connection.execute(mark_settled_sql, {'settled_at': datetime.now()})
+            connection.execute(credit_sql)
+            bets, users, paid = connection.execute(total_paid_sql).one()
+        return {'bets': bets, 'users': users, 'paid': paid}
@@ -0,0 +1,14 @@
+"""
+Dedicated job worker: runs queued crawl/rank/reprice/teams jobs (and the scheduled crawl, see JOB_INTERVAL)
+outside the web processes. Start the web processes with RUN_JOBS=0 so they only enqueue.
+
+    python migrate.py
+    RUN_JOBS=0 gunicorn main:app
+    python worker.py
+"""
+from main import jobs_manager, metrics_manager
+
+
+if __name__ == '__main__':
+    metrics_manager.start()  # its metrics file is summed into every web worker's /metrics (METRICS_DIR)
+    jobs_manager.run()